@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+
+from optician.logger import get_logger
+
+CONSOLE_LOGGER = get_logger()
+
+
+def get_fingerprint(*values):
+    return hashlib.sha256(json.dumps(values, default=str).encode()).hexdigest()
+
+
+def get_content_fingerprint(content: str):
+    # Same as the fingerprint of a file written with this content
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def get_file_fingerprint(file_path: str):
+    try:
+        with open(file_path, "rb") as file:
+            return hashlib.sha256(file.read()).hexdigest()
+    except OSError:
+        return None
+
+
+class CheckpointJournal:
+    def __init__(
+        self,
+        journal_path: str,
+        run_fingerprint: str,
+        resume: bool = False,
+        sync_every: int = 100,
+    ):
+        """Journal of the completed steps of a run, to resume it after a failure.
+
+        The journal is a JSON lines file. The first line identifies the run, and a
+        line is appended and flushed as each step completes, so it survives the
+        process being killed. The lines are synced to disk in batches, so a crash
+        of the machine can at most lose the last batch of steps, which are run
+        again on resume. A truncated last line is ignored.
+
+        Args:
+            journal_path (str): Path of the journal file.
+            run_fingerprint (str): Fingerprint of the run parameters. The journal
+                is only resumed if it was written by a run with the same parameters.
+            resume (bool): Whether to resume from an existing journal. If False, or
+                if the journal doesn't match the run, it is started again.
+            sync_every (int): Number of steps recorded between two syncs to disk.
+        """
+        self.journal_path = journal_path
+        self.run_fingerprint = run_fingerprint
+        self.sync_every = sync_every
+        self.completed = {}
+        self._file = None
+        self._unsynced = 0
+
+        if resume:
+            self._load()
+        if not self.completed:
+            self._start()
+        else:
+            self._file = open(self.journal_path, "a")
+
+    def _load(self):
+        if not os.path.exists(self.journal_path):
+            CONSOLE_LOGGER.info("No checkpoint found at %s", self.journal_path)
+            return
+        with open(self.journal_path, "r") as file:
+            lines = file.read().splitlines()
+
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # Last line cut by a crash
+                break
+        if not entries or entries[0].get("run") != self.run_fingerprint:
+            CONSOLE_LOGGER.warning(
+                "Checkpoint %s is from a different run, starting again",
+                self.journal_path,
+            )
+            return
+        for entry in entries[1:]:
+            self.completed[entry["key"]] = entry["fingerprint"]
+        CONSOLE_LOGGER.info(
+            "Resuming from checkpoint with %s completed steps", len(self.completed)
+        )
+
+    def _start(self):
+        journal_dir = os.path.dirname(self.journal_path)
+        if journal_dir:
+            os.makedirs(journal_dir, exist_ok=True)
+        self._file = open(self.journal_path, "w")
+        self._file.write(json.dumps({"run": self.run_fingerprint}) + "\n")
+        self.sync()
+
+    def is_completed(self, key: str, fingerprint: str):
+        return fingerprint is not None and self.completed.get(key) == fingerprint
+
+    def record(self, key: str, fingerprint: str):
+        self.completed[key] = fingerprint
+        self._file.write(json.dumps({"key": key, "fingerprint": fingerprint}) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            self.sync()
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        # Keep the journal of a failed run, to resume it
+        if self._file is not None and not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def finish(self):
+        # The run completed, nothing to resume
+        if self._file is not None:
+            self._file.close()
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
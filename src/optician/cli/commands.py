@@ -1,14 +1,30 @@
 import argparse
 import os
 import sys
+from datetime import datetime, timezone
 
-from optician.vc_client import GithubClient
+from optician.checkpoint import CheckpointJournal, get_fingerprint
 from optician.db_client import DbClient as db
-from optician.diff_tracker import DiffTracker
-from optician.lookml_generator import LookMLGenerator
-from optician.logger import Logger
+from optician.diff_tracker import DiffTracker, parse_timestamp
+from optician.diff_tracker import commit_pending_runs, read_last_run, write_last_run
+from optician.lookml_generator import LookMLGenerator, generate_lookml_for_targets
+from optician.sinks import (
+    STREAM_PATH,
+    DirectorySink,
+    is_directory_output,
+    open_sink,
+)
+from optician.logger import DEFAULT_LOG_FILE, configure_logging, get_logger
+from optician.profiler import PROFILER
+from optician.server import DEFAULT_HOST, DEFAULT_PORT, DEFAULT_SCHEMA_TTL
+from optician.server import request_server, serve
+from optician.sharding import filter_shard, parse_shard
+from optician.sharding import merge_manifests, write_manifest
 
-CONSOLE_LOGGER = Logger().get_logger()
+CONSOLE_LOGGER = get_logger()
+
+DEFAULT_STATE_FILE = os.path.join(".optician", "state.json")
+DEFAULT_GITHUB_CACHE_DIR = os.path.join(".optician", "github-cache")
 
 
 def cli():
@@ -16,8 +32,53 @@ def cli():
 
     subparsers = parser.add_subparsers(dest="command", title="commands", metavar="")
 
+    # Options shared by the commands
+    logging_parser = argparse.ArgumentParser(add_help=False)
+    logging_parser.add_argument(
+        "--log-level",
+        type=str,
+        help="Level of the console logs",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        default="INFO",
+    )
+    logging_parser.add_argument(
+        "--log-file",
+        type=str,
+        help="Path of the log file, use an empty string to disable it",
+        default=DEFAULT_LOG_FILE,
+    )
+    logging_parser.add_argument(
+        "--log-format",
+        type=str,
+        help="Format of the logs (text or json lines)",
+        choices=["text", "json"],
+        default="text",
+    )
+    profile_parser = argparse.ArgumentParser(add_help=False)
+    profile_parser.add_argument(
+        "--profile",
+        help="Print a per-phase and per-table timing breakdown",
+        action="store_true",
+    )
+    profile_parser.add_argument(
+        "--profile-stats",
+        type=str,
+        help="Path to dump the cProfile stats to (implies --profile)",
+        required=False,
+    )
+    profile_parser.add_argument(
+        "--trace-file",
+        type=str,
+        help="Path to write a Chrome trace JSON file to (implies --profile)",
+        required=False,
+    )
+
     # track_diff_models parser
-    diff_tracker_parser = subparsers.add_parser("diff_tracker", help="Run diff tracker")
+    diff_tracker_parser = subparsers.add_parser(
+        "diff_tracker",
+        help="Run diff tracker",
+        parents=[logging_parser, profile_parser],
+    )
     diff_tracker_parser.add_argument(
         "--db_type",
         type=str,
@@ -48,10 +109,54 @@ def cli():
         help="List of models to compare (comma separated) or file path",
     )
     diff_tracker_parser.add_argument("--output", type=str, help="Output file path")
+    diff_tracker_parser.add_argument(
+        "--since",
+        type=str,
+        help="Only compare models modified since an ISO timestamp or last-run",
+        required=False,
+    )
+    diff_tracker_parser.add_argument(
+        "--state-file",
+        type=str,
+        help="File where the time of the last run is stored",
+        default=DEFAULT_STATE_FILE,
+    )
+    diff_tracker_parser.add_argument(
+        "--no-save-state",
+        help="Store the time of this run as pending, until optician save_state",
+        action="store_true",
+    )
+    diff_tracker_parser.add_argument(
+        "--shard",
+        type=str,
+        help="Only process the shard i of N of the models, e.g. 1/4",
+        required=False,
+    )
+    diff_tracker_parser.add_argument(
+        "--manifest",
+        type=str,
+        help="Path to write the shard manifest to",
+        required=False,
+    )
+    diff_tracker_parser.add_argument(
+        "--server",
+        type=str,
+        help="URL of a running optician server to send the command to, "
+        "or unix:// followed by the path of its socket",
+        default=os.getenv("OPTICIAN_SERVER", None),
+        required=False,
+    )
+    diff_tracker_parser.add_argument(
+        "--refresh",
+        help="Fetch the schemas of the models again instead of using the server cache",
+        action="store_true",
+    )
 
     # generate_lookml parser
     generate_lookml_parser = subparsers.add_parser(
-        "generate_lookml", help="Run generate LookML"
+        "generate_lookml",
+        help="Run generate LookML",
+        parents=[logging_parser, profile_parser],
     )
     generate_lookml_parser.add_argument(
         "--db_type",
@@ -60,10 +165,16 @@ def cli():
         required=True,
     )
     generate_lookml_parser.add_argument(
-        "--project", type=str, help="Project ID", required=True
+        "--project", type=str, help="Project ID", required=False
     )
     generate_lookml_parser.add_argument(
-        "--dataset", type=str, help="Dataset ID to read the models from", required=True
+        "--dataset", type=str, help="Dataset ID to read the models from", required=False
+    )
+    generate_lookml_parser.add_argument(
+        "--targets",
+        type=str,
+        help="List of project.dataset targets separated by comma or provide a file path",
+        required=False,
     )
     generate_lookml_parser.add_argument(
         "--tables",
@@ -72,7 +183,10 @@ def cli():
         required=True,
     )
     generate_lookml_parser.add_argument(
-        "--output-dir", type=str, help="Output Directory", required=False
+        "--output-dir",
+        type=str,
+        help="Output Directory, .tar, .tar.gz or .zip archive, or - for stdout",
+        required=False,
     )
     generate_lookml_parser.add_argument(
         "--override-dataset-id", type=str, help="Override Dataset ID", required=False
@@ -80,10 +194,55 @@ def cli():
     generate_lookml_parser.add_argument(
         "--service-account", type=str, help="Service Account", required=False
     )
+    generate_lookml_parser.add_argument(
+        "--shard",
+        type=str,
+        help="Only process the shard i of N of the tables, e.g. 1/4",
+        required=False,
+    )
+    generate_lookml_parser.add_argument(
+        "--manifest",
+        type=str,
+        help="Path to write the shard manifest to",
+        required=False,
+    )
+    generate_lookml_parser.add_argument(
+        "--resume",
+        help="Skip the views completed by a previous failed run",
+        action="store_true",
+    )
+    generate_lookml_parser.add_argument(
+        "--checkpoint-file",
+        type=str,
+        help="Path of the checkpoint journal of the run. Defaults to "
+        ".optician/checkpoint-generate_lookml.jsonl, with the shard in the name",
+        required=False,
+    )
+    generate_lookml_parser.add_argument(
+        "--max-workers",
+        type=int,
+        help="Number of tables fetched concurrently, shared by all the targets",
+        default=8,
+    )
+    generate_lookml_parser.add_argument(
+        "--server",
+        type=str,
+        help="URL of a running optician server to send the command to, "
+        "or unix:// followed by the path of its socket",
+        default=os.getenv("OPTICIAN_SERVER", None),
+        required=False,
+    )
+    generate_lookml_parser.add_argument(
+        "--refresh",
+        help="Fetch the schemas of the tables again instead of using the server cache",
+        action="store_true",
+    )
 
     # push_to_looker
     push_to_looker_parser = subparsers.add_parser(
-        "push_to_looker", help="Run Push to Looker"
+        "push_to_looker",
+        help="Run Push to Looker",
+        parents=[logging_parser, profile_parser],
     )
     push_to_looker_parser.add_argument(
         "--token", type=str, help="GitHub Token", required=True
@@ -97,7 +256,7 @@ def cli():
     push_to_looker_parser.add_argument(
         "--input-dir",
         type=str,
-        help="Path that contains new files to be committed",
+        help="Directory or archive of the files to be committed, or - for stdin",
         required=True,
     )
     push_to_looker_parser.add_argument(
@@ -118,8 +277,202 @@ def cli():
         help="Name of the base branch",
         default="main",
     )
+    push_to_looker_parser.add_argument(
+        "--backend",
+        type=str,
+        help="Push through the GitHub API (api) or a local git working tree (git)",
+        choices=["api", "git"],
+        default="api",
+    )
+    push_to_looker_parser.add_argument(
+        "--resume",
+        help="Skip the files completed by a previous failed run",
+        action="store_true",
+    )
+    push_to_looker_parser.add_argument(
+        "--checkpoint-file",
+        type=str,
+        help="Path of the checkpoint journal of the run. Defaults to "
+        ".optician/checkpoint-push_to_looker.jsonl",
+        required=False,
+    )
+    push_to_looker_parser.add_argument(
+        "--cache-dir",
+        type=str,
+        help="Directory of the GitHub API cache, use an empty string to disable it",
+        default=DEFAULT_GITHUB_CACHE_DIR,
+    )
+    push_to_looker_parser.add_argument(
+        "--api-url",
+        type=str,
+        help="Base URL of the GitHub API, defaults to https://api.github.com",
+        required=False,
+    )
+    push_to_looker_parser.add_argument(
+        "--remote-url",
+        type=str,
+        help="Remote repository URL for the git backend (defaults to GitHub)",
+        required=False,
+    )
+    push_to_looker_parser.add_argument(
+        "--server",
+        type=str,
+        help="URL of a running optician server to send the command to, "
+        "or unix:// followed by the path of its socket",
+        default=os.getenv("OPTICIAN_SERVER", None),
+        required=False,
+    )
+
+    # watch
+    watch_parser = subparsers.add_parser(
+        "watch",
+        help="Regenerate the LookML views of the models rebuilt by dbt",
+        parents=[logging_parser],
+    )
+    watch_parser.add_argument(
+        "--db_type",
+        type=str,
+        help="Database type (bigquery, redshift, snowflake)",
+        required=True,
+    )
+    watch_parser.add_argument("--project", type=str, help="Project ID", required=True)
+    watch_parser.add_argument(
+        "--dataset", type=str, help="Dataset ID to read the models from", required=True
+    )
+    watch_parser.add_argument(
+        "--target-dir",
+        type=str,
+        help="dbt target directory with the run_results.json and manifest.json",
+        default="target",
+    )
+    watch_parser.add_argument(
+        "--tables",
+        type=str,
+        help="Only regenerate these tables (comma separated) or provide a file path",
+        required=False,
+    )
+    watch_parser.add_argument(
+        "--output-dir", type=str, help="Output Directory", required=False
+    )
+    watch_parser.add_argument(
+        "--override-dataset-id", type=str, help="Override Dataset ID", required=False
+    )
+    watch_parser.add_argument(
+        "--service-account", type=str, help="Service Account", required=False
+    )
+    watch_parser.add_argument(
+        "--poll-interval",
+        type=float,
+        help="Seconds between two checks of the dbt artifacts",
+        default=1.0,
+    )
+    watch_parser.add_argument(
+        "--debounce",
+        type=float,
+        help="Seconds the dbt artifacts must be unchanged before regenerating",
+        default=2.0,
+    )
+
+    # merge
+    merge_parser = subparsers.add_parser(
+        "merge",
+        help="Merge the manifests of sharded runs",
+        parents=[logging_parser],
+    )
+    merge_parser.add_argument(
+        "--manifests",
+        type=str,
+        nargs="+",
+        help="Paths of the manifests of all the shards",
+        required=True,
+    )
+    merge_parser.add_argument(
+        "--output", type=str, help="Output file path for diff results", required=False
+    )
+    merge_parser.add_argument(
+        "--output-dir",
+        type=str,
+        help="Directory to copy the generated views to",
+        required=False,
+    )
+
+    # save_state
+    save_state_parser = subparsers.add_parser(
+        "save_state",
+        help="Save the time of the runs made with --no-save-state as the last runs",
+        parents=[logging_parser],
+    )
+    save_state_parser.add_argument(
+        "--state-file",
+        type=str,
+        help="File where the time of the last run is stored",
+        default=DEFAULT_STATE_FILE,
+    )
+
+    # serve
+    serve_parser = subparsers.add_parser(
+        "serve",
+        help="Run a local optician server with warm clients",
+        parents=[logging_parser],
+    )
+    serve_parser.add_argument(
+        "--host",
+        type=str,
+        help="Loopback address to bind the server to",
+        default=DEFAULT_HOST,
+    )
+    serve_parser.add_argument(
+        "--port", type=int, help="Port to bind the server to", default=DEFAULT_PORT
+    )
+    serve_parser.add_argument(
+        "--schema-ttl",
+        type=float,
+        help="Number of seconds table schemas are cached for",
+        default=DEFAULT_SCHEMA_TTL,
+    )
+    serve_parser.add_argument(
+        "--socket",
+        type=str,
+        help="Listen on this unix socket instead of the host and port",
+        required=False,
+    )
 
     args = parser.parse_args()
+
+    if getattr(args, "shard", None):
+        try:
+            args.shard = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+
+    if args.command is not None:
+        configure_logging(
+            level=args.log_level,
+            log_file=args.log_file or None,
+            log_format=args.log_format,
+        )
+
+    profile = getattr(args, "profile", False) or getattr(args, "trace_file", None)
+    profile_stats = getattr(args, "profile_stats", None)
+    if not (profile or profile_stats):
+        run_command(parser, args)
+        return
+
+    PROFILER.enable(cprofile=profile_stats is not None)
+    try:
+        run_command(parser, args)
+    finally:
+        PROFILER.disable()
+        CONSOLE_LOGGER.info(PROFILER.report())
+        if args.trace_file:
+            PROFILER.write_chrome_trace(args.trace_file)
+            CONSOLE_LOGGER.info("Chrome trace written to %s", args.trace_file)
+        if profile_stats:
+            PROFILER.dump_stats(profile_stats)
+            CONSOLE_LOGGER.info("cProfile stats written to %s", profile_stats)
+
+
+def run_command(parser: argparse.ArgumentParser, args: argparse.Namespace):
     if args.command == "diff_tracker":
         models = args.models.split(",")
         if len(models) == 1:
@@ -129,35 +482,81 @@ def cli():
                 with open(models_file_path, "r") as file:
                     models = file.read().splitlines()
 
-        CONSOLE_LOGGER.info(f"Models to be compared: {models}")
+        if args.shard:
+            models = filter_shard(models, *args.shard)
 
-        credentials = {
-            "service_account": args.service_account,
-            "project_id": args.project,
-            # Add other credentials for other databases here
-        }
+        CONSOLE_LOGGER.info("Models to be compared: %s", models)
 
-        db_client = db(db_type=args.db_type, credentials=credentials)
+        run_started_at = datetime.now(timezone.utc)
+        last_run_key = f"{args.project}.{args.dataset1_name}:{args.dataset2_name}"
+        if args.shard:
+            # Each shard compares different models, so it has its own cutoff
+            last_run_key += ":shard-{}-of-{}".format(*args.shard)
+        since = None
+        if args.since == "last-run":
+            since = read_last_run(args.state_file, last_run_key)
+            if since is None:
+                CONSOLE_LOGGER.info("No previous run found. Comparing all models")
+        elif args.since:
+            try:
+                since = parse_timestamp(args.since)
+            except ValueError:
+                parser.error(f"Invalid --since timestamp {args.since}")
+        if since is not None:
+            CONSOLE_LOGGER.info("Comparing models modified since %s", since)
 
-        dt = DiffTracker(
-            dataset1_name=args.dataset1_name,
-            dataset2_name=args.dataset2_name,
-            db_client=db_client,
-            models=models,
-            full_refresh=args.full_refresh,
-        )
-        results = dt.get_diff_tables()
-        CONSOLE_LOGGER.info(f"New models: {results['new_models']}")
-        CONSOLE_LOGGER.info(f"Diff models: {results['diff_models']}")
-        CONSOLE_LOGGER.info(f"Missing models: {results['missing_models']}")
+        if args.server:
+            results = request_server(
+                args.server,
+                "/diff",
+                {
+                    "db_type": args.db_type,
+                    "project": args.project,
+                    "service_account": args.service_account,
+                    "dataset1_name": args.dataset1_name,
+                    "dataset2_name": args.dataset2_name,
+                    "models": models,
+                    "full_refresh": bool(args.full_refresh),
+                    "since": since.isoformat() if since else None,
+                    "refresh": args.refresh,
+                },
+            )
+        else:
+            credentials = {
+                "service_account": args.service_account,
+                "project_id": args.project,
+                # Add other credentials for other databases here
+            }
+
+            db_client = db(db_type=args.db_type, credentials=credentials)
+
+            dt = DiffTracker(
+                dataset1_name=args.dataset1_name,
+                dataset2_name=args.dataset2_name,
+                db_client=db_client,
+                models=models,
+                full_refresh=args.full_refresh,
+                since=since,
+            )
+            results = dt.get_diff_tables()
+        CONSOLE_LOGGER.info("New models: %s", results["new_models"])
+        CONSOLE_LOGGER.info("Diff models: %s", results["diff_models"])
+        CONSOLE_LOGGER.info("Missing models: %s", results["missing_models"])
 
         # Save output to file
-        output = results["diff_models"]
-        output += results["new_models"]
-        with open(args.output, "w") as f:
-            for o in output:
-                f.write(f"{o}\n")
-            pass
+        _write_diff_output(args.output, results)
+        write_last_run(
+            args.state_file, last_run_key, run_started_at, pending=args.no_save_state
+        )
+
+        if args.shard:
+            write_manifest(
+                args.manifest or _default_manifest_path(args.command, *args.shard),
+                command=args.command,
+                index=args.shard[0],
+                count=args.shard[1],
+                results=results,
+            )
 
     elif args.command == "generate_lookml":
         tables = args.tables.split(",")
@@ -168,38 +567,172 @@ def cli():
                 with open(tables_file_path, "r") as file:
                     tables = file.read().splitlines()
 
-        CONSOLE_LOGGER.info(f"Models to be created: {tables}")
+        CONSOLE_LOGGER.info("Models to be created: %s", tables)
 
-        credentials = {
-            "service_account": args.service_account,
-            "project_id": args.project
-            # Add other credentials for other databases here
-        }
+        if args.shard:
+            tables = filter_shard(tables, *args.shard)
 
-        db_client = db(db_type=args.db_type, credentials=credentials)
-        lookml = LookMLGenerator(db_client, args.dataset)
-        lookml.generate_batch_lookml_views(
-            tables=tables,
-            output_dir=args.output_dir,
-            override_dataset_id=args.override_dataset_id,
+        if args.resume and (args.targets or args.server):
+            parser.error("--resume is not supported with --targets or --server")
+
+        # Archives and stdout are written as one stream, through a single sink
+        is_archive = args.output_dir is not None and not is_directory_output(
+            args.output_dir
         )
+        if is_archive and (args.server or args.resume or args.shard):
+            parser.error(
+                "--server, --resume and --shard require a directory as --output-dir"
+            )
+        if args.targets:
+            if args.server:
+                parser.error("--targets is not supported with --server")
+            # Targets contain dots, so only read them from a file if it exists
+            if os.path.isfile(args.targets):
+                with open(args.targets, "r") as file:
+                    targets = [t for t in file.read().splitlines() if t]
+            else:
+                targets = args.targets.split(",")
+            targets = [tuple(t.strip().split(".", 1)) for t in targets]
+            if any(len(t) != 2 for t in targets):
+                parser.error("--targets must be a list of project.dataset")
+
+        elif not args.project or not args.dataset:
+            parser.error("--project and --dataset are required without --targets")
+
+        # Only create the archive once the arguments are valid. A failed run
+        # removes it, so no partial archive is left behind.
+        if is_archive:
+            sink = open_sink(args.output_dir)
+            output_dir = None
+        else:
+            sink = DirectorySink()
+            output_dir = args.output_dir
+
+        with sink:
+            if args.targets:
+                CONSOLE_LOGGER.info("Targets: %s", [f"{p}.{d}" for p, d in targets])
+
+                # Share one database client per project between all the targets
+                db_clients = {}
+                for project, _ in targets:
+                    if project not in db_clients:
+                        credentials = {
+                            "service_account": args.service_account,
+                            "project_id": project,
+                            # Add other credentials for other databases here
+                        }
+                        db_clients[project] = db(
+                            db_type=args.db_type, credentials=credentials
+                        )
+
+                target_views = generate_lookml_for_targets(
+                    db_clients=db_clients,
+                    targets=targets,
+                    tables=tables,
+                    output_dir=output_dir,
+                    override_dataset_id=args.override_dataset_id,
+                    max_workers=args.max_workers,
+                    sink=sink,
+                )
+                views = [view for paths in target_views.values() for view in paths]
+
+            elif args.server:
+                # The server does not share our working directory, send absolute paths
+                response = request_server(
+                    args.server,
+                    "/generate",
+                    {
+                        "db_type": args.db_type,
+                        "project": args.project,
+                        "service_account": args.service_account,
+                        "dataset": args.dataset,
+                        "tables": tables,
+                        "output_dir": os.path.abspath(args.output_dir or os.getcwd()),
+                        "override_dataset_id": args.override_dataset_id,
+                        "refresh": args.refresh,
+                        "max_workers": args.max_workers,
+                    },
+                )
+                views = response["views"]
+                CONSOLE_LOGGER.info("LookML views generated by server %s", args.server)
+
+            else:
+                credentials = {
+                    "service_account": args.service_account,
+                    "project_id": args.project
+                    # Add other credentials for other databases here
+                }
+
+                db_client = db(db_type=args.db_type, credentials=credentials)
+                lookml = LookMLGenerator(db_client, args.dataset, sink=sink)
+                journal = None
+                if not is_archive:
+                    journal = CheckpointJournal(
+                        args.checkpoint_file
+                        or _default_checkpoint_path(args.command, args.shard),
+                        run_fingerprint=get_fingerprint(
+                            args.command,
+                            args.project,
+                            args.dataset,
+                            args.override_dataset_id,
+                            os.path.abspath(args.output_dir or os.getcwd()),
+                            lookml.config.fingerprint(),
+                            args.shard,
+                        ),
+                        resume=args.resume,
+                    )
+                try:
+                    views = lookml.generate_batch_lookml_views(
+                        tables=tables,
+                        output_dir=output_dir,
+                        override_dataset_id=args.override_dataset_id,
+                        max_workers=args.max_workers,
+                        journal=journal,
+                    )
+                finally:
+                    if journal is not None:
+                        journal.close()
+                if journal is not None:
+                    journal.finish()
+
+        if args.shard:
+            write_manifest(
+                args.manifest or _default_manifest_path(args.command, *args.shard),
+                command=args.command,
+                index=args.shard[0],
+                count=args.shard[1],
+                views_dir=args.output_dir,
+                views=views,
+            )
 
     elif args.command == "push_to_looker":
-        if not os.path.exists(args.input_dir):
-            CONSOLE_LOGGER.warn(
-                f"Input directory {args.input_dir} does not exist. No files to commit. Exiting..."
+        if args.resume and (args.server or args.backend == "git"):
+            parser.error("--resume is not supported with --server or --backend git")
+
+        if args.input_dir == STREAM_PATH and args.server:
+            parser.error("--input-dir - is not supported with --server")
+
+        if args.input_dir != STREAM_PATH and not os.path.exists(args.input_dir):
+            CONSOLE_LOGGER.warning(
+                "Input directory %s does not exist. No files to commit. Exiting...",
+                args.input_dir,
             )
 
-        else:
-            # Create Github client
+        elif args.backend == "git":
+            if args.server:
+                parser.error("--backend git is not supported with --server")
+            # Imported here, since PyGithub takes long to import and the other
+            # commands don't need it
+            from optician.vc_client import GitClient
 
-            G = GithubClient(
+            G = GitClient(
                 token=args.token,
                 repo=args.repo,
                 user_email=args.user_email,
+                remote_url=args.remote_url,
             )
 
-            # Create branch and commit files
+            # Commit all files at once and push them
             G.update_files(
                 input_dir=args.input_dir,
                 output_dir=args.output_dir,
@@ -207,6 +740,139 @@ def cli():
                 base_branch=args.base_branch,
             )
 
+        elif args.server:
+            request_server(
+                args.server,
+                "/push",
+                {
+                    "token": args.token,
+                    "repo": args.repo,
+                    "user_email": args.user_email,
+                    "input_dir": os.path.abspath(args.input_dir),
+                    "output_dir": args.output_dir,
+                    "branch_name": args.branch_name,
+                    "base_branch": args.base_branch,
+                    "cache_dir": (
+                        os.path.abspath(args.cache_dir) if args.cache_dir else None
+                    ),
+                    "api_url": args.api_url,
+                },
+            )
+
+        else:
+            from optician.vc_client import DEFAULT_GITHUB_API_URL, GithubClient
+
+            # Create Github client
+            G = GithubClient(
+                token=args.token,
+                repo=args.repo,
+                user_email=args.user_email,
+                cache_dir=args.cache_dir or None,
+                base_url=args.api_url or DEFAULT_GITHUB_API_URL,
+            )
+
+            journal = CheckpointJournal(
+                args.checkpoint_file or _default_checkpoint_path(args.command),
+                run_fingerprint=get_fingerprint(
+                    args.command, args.repo, args.output_dir, args.branch_name
+                ),
+                resume=args.resume,
+            )
+
+            # Create branch and commit files
+            try:
+                G.update_files(
+                    input_dir=args.input_dir,
+                    output_dir=args.output_dir,
+                    target_branch=args.branch_name,
+                    base_branch=args.base_branch,
+                    journal=journal,
+                )
+            finally:
+                journal.close()
+            journal.finish()
+
+    elif args.command == "watch":
+        tables = None
+        if args.tables:
+            tables = args.tables.split(",")
+            if len(tables) == 1:
+                # If the tables argument is a file path, read the file
+                if "." in tables[0]:
+                    tables_file_path = tables[0]
+                    with open(tables_file_path, "r") as file:
+                        tables = file.read().splitlines()
+
+        credentials = {
+            "service_account": args.service_account,
+            "project_id": args.project,
+            # Add other credentials for other databases here
+        }
+
+        from optician.watcher import DbtArtifactWatcher
+
+        # The database client stays warm between the dbt runs
+        db_client = db(db_type=args.db_type, credentials=credentials)
+        watcher = DbtArtifactWatcher(
+            LookMLGenerator(db_client, args.dataset),
+            target_dir=args.target_dir,
+            output_dir=args.output_dir,
+            override_dataset_id=args.override_dataset_id,
+            tables=tables,
+            poll_interval=args.poll_interval,
+            debounce=args.debounce,
+        )
+        try:
+            watcher.watch()
+        except KeyboardInterrupt:
+            CONSOLE_LOGGER.info("Stopped watching")
+
+    elif args.command == "merge":
+        results = merge_manifests(args.manifests, output_dir=args.output_dir)
+        if results:
+            CONSOLE_LOGGER.info("New models: %s", results["new_models"])
+            CONSOLE_LOGGER.info("Diff models: %s", results["diff_models"])
+            CONSOLE_LOGGER.info("Missing models: %s", results["missing_models"])
+            if args.output:
+                _write_diff_output(args.output, results)
+
+    elif args.command == "save_state":
+        keys = commit_pending_runs(args.state_file)
+        if keys:
+            CONSOLE_LOGGER.info("Saved the last run of %s", keys)
+        else:
+            CONSOLE_LOGGER.info("No pending run to save in %s", args.state_file)
+
+    elif args.command == "serve":
+        try:
+            serve(
+                host=args.host,
+                port=args.port,
+                schema_ttl=args.schema_ttl,
+                socket_path=args.socket,
+            )
+        except ValueError as e:
+            parser.error(str(e))
+
+
+def _write_diff_output(output_path: str, results: dict):
+    output = results["diff_models"] + results["new_models"]
+    with open(output_path, "w") as f:
+        for o in output:
+            f.write(f"{o}\n")
+
+
+def _default_manifest_path(command: str, index: int, count: int):
+    return f"{command}-shard-{index}-of-{count}.json"
+
+
+def _default_checkpoint_path(command: str, shard: tuple = None):
+    # Shards run on the same machine don't share a journal
+    file_name = f"checkpoint-{command}"
+    if shard:
+        file_name += "-shard-{}-of-{}".format(*shard)
+    return os.path.join(".optician", f"{file_name}.jsonl")
+
 
 def execute_from_command_line():
     cli()
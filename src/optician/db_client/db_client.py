@@ -1,12 +1,92 @@
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from importlib import import_module
 
+from optician.profiler import span
+
+
+class SchemaCache:
+    def __init__(self, ttl: float = 300, max_entries: int = 10000):
+        """In-memory cache of table schemas with time based eviction.
+
+        Args:
+            ttl (float): Number of seconds a table schema is kept in the cache.
+            max_entries (int): Maximum number of tables kept in the cache. The entries
+                closest to expiry are evicted first when the cache is full.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version=None):
+        """Return the cached value, or None if it expired or its version changed.
+
+        Args:
+            key: Cache key.
+            version: Version of the value expected by the caller, e.g. the last
+                modification time of the table. Not checked if None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if (
+                entry is None
+                or entry[0] < time.monotonic()
+                or (version is not None and entry[2] != version)
+            ):
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, version=None):
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                self._evict()
+            self._entries[key] = (time.monotonic() + self.ttl, value, version)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _evict(self):
+        # Drop expired entries, and if that is not enough the oldest ones
+        now = time.monotonic()
+        for key in [k for k, v in self._entries.items() if v[0] < now]:
+            del self._entries[key]
+        if len(self._entries) >= self.max_entries:
+            oldest = sorted(self._entries, key=lambda k: self._entries[k][0])
+            for key in oldest[: len(self._entries) - self.max_entries + 1]:
+                del self._entries[key]
+
 
 class DbClient:
     SUPPORTED_DATABASES = ["bigquery"]
 
-    def __init__(self, db_type: str, credentials: dict):
+    def __init__(
+        self, db_type: str, credentials: dict, schema_cache: SchemaCache = None
+    ):
         self.db_type = db_type
         self.credentials = credentials
+        self.schema_cache = schema_cache
         self.db_client = None
 
         if self.db_type == "bigquery":
@@ -17,11 +97,100 @@ class DbClient:
         else:
             raise Exception(f"Database type {self.db_type} not supported")
 
-    def get_table(self, *args, **kwargs):
-        return self.db_client.get_table(*args, **kwargs)
+    def _cache_key(self, dataset_id: str, table_id: str):
+        return (
+            self.db_type,
+            self.credentials.get("project_id", None),
+            dataset_id,
+            table_id,
+        )
+
+    def get_table(self, dataset_id: str, table_id: str, last_modified=None):
+        """Return the schema of a table, from the schema cache if there is one.
+
+        Args:
+            dataset_id (str): Dataset ID.
+            table_id (str): Table ID.
+            last_modified (datetime): Last modification time of the table. If given,
+                a schema cached before the table was modified is fetched again.
+        """
+        if self.schema_cache is None:
+            with span("db.get_table", table=table_id, dataset=dataset_id):
+                return self.db_client.get_table(dataset_id, table_id)
+
+        key = self._cache_key(dataset_id, table_id)
+        table = self.schema_cache.get(key, version=last_modified)
+        if table is None:
+            with span("db.get_table", table=table_id, dataset=dataset_id):
+                table = self.db_client.get_table(dataset_id, table_id)
+            self.schema_cache.set(key, table, version=last_modified)
+        return table
+
+    def invalidate_tables(self, dataset_id: str, table_ids: list):
+        # Drop the cached schemas, e.g. after the tables have been rebuilt by dbt
+        if self.schema_cache is not None:
+            for table_id in table_ids:
+                self.schema_cache.invalidate(self._cache_key(dataset_id, table_id))
+
+    def list_table_ids(self, dataset_id: str):
+        with span("db.list_table_ids", dataset=dataset_id):
+            return self.db_client.list_table_ids(dataset_id)
 
-    def list_tables(self, *args, **kwargs):
-        return self.db_client.list_tables(*args, **kwargs)
+    def list_tables(self, dataset_id: str):
+        with span("db.list_tables", dataset=dataset_id):
+            tables = self.db_client.list_tables(dataset_id)
+        if self.schema_cache is not None:
+            for table in tables:
+                self.schema_cache.set(self._cache_key(dataset_id, table.name), table)
+        return tables
+
+    def get_tables_last_modified(self, dataset_id: str):
+        with span("db.get_tables_last_modified", dataset=dataset_id):
+            return self.db_client.get_tables_last_modified(dataset_id)
+
+    def get_tables(
+        self,
+        dataset_id: str,
+        table_ids: list,
+        max_workers: int = 8,
+        last_modified: dict = None,
+        executor: ThreadPoolExecutor = None,
+    ):
+        return list(
+            self.iter_tables(
+                dataset_id,
+                table_ids,
+                max_workers=max_workers,
+                last_modified=last_modified,
+                executor=executor,
+            )
+        )
+
+    def iter_tables(
+        self,
+        dataset_id: str,
+        table_ids: list,
+        max_workers: int = 8,
+        last_modified: dict = None,
+        executor: ThreadPoolExecutor = None,
+    ):
+        # Fetch the table schemas concurrently, yielding them in the order of
+        # table_ids as soon as they are available. An executor shared between
+        # calls bounds the number of concurrent fetches across all of them.
+        last_modified = last_modified or {}
+
+        def get_table(table_id):
+            return self.get_table(dataset_id, table_id, last_modified.get(table_id))
+
+        if executor is not None:
+            yield from executor.map(get_table, table_ids)
+            return
+        if max_workers <= 1 or len(table_ids) <= 1:
+            for table_id in table_ids:
+                yield get_table(table_id)
+            return
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            yield from executor.map(get_table, table_ids)
 
     # Defining the method in the client class since the definition
     # may differ between databases
@@ -85,10 +254,25 @@ class BQClient:
             table.add_field_to_schema(field=field)
         return table
 
-    def list_tables(self, dataset_id: str):
+    def list_table_ids(self, dataset_id: str):
+        # Only lists the table names, without fetching their schemas
         dataset_ref = self.bq.dataset(dataset_id)
-        tables = self.bq.list_tables(dataset_ref)
-        return [self.get_table(dataset_id, table.table_id) for table in tables]
+        return [table.table_id for table in self.bq.list_tables(dataset_ref)]
+
+    def list_tables(self, dataset_id: str):
+        return [
+            self.get_table(dataset_id, table_id)
+            for table_id in self.list_table_ids(dataset_id)
+        ]
+
+    def get_tables_last_modified(self, dataset_id: str):
+        # Read the modification time of all the tables in a single metadata query
+        query = (
+            "SELECT table_id, TIMESTAMP_MILLIS(last_modified_time) AS last_modified "
+            f"FROM `{self.project_id}.{dataset_id}.__TABLES__`"
+        )
+        rows = self.bq.query(query).result()
+        return {row.table_id: row.last_modified for row in rows}
 
 
 class Field:
@@ -139,6 +323,15 @@ class Field:
     def add_nested_field(self, field):
         self.fields.append(field)
 
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "internal_type": self.internal_type,
+            "mode": self.mode,
+            "description": self.description,
+            "fields": [field.as_dict() for field in self.fields],
+        }
+
 
 class Table:
     def __init__(self, name: str, internal_schema) -> None:
@@ -177,3 +370,12 @@ class Table:
 
     def get_schema_as_dict(self):
         return self.schema.__dict__
+
+    def fingerprint(self):
+        """Hash of the table schema, independent of the table name.
+
+        Two tables with the same fields (names, types, modes and descriptions, in
+        the same order) have the same fingerprint.
+        """
+        schema = json.dumps([field.as_dict() for field in self.schema])
+        return hashlib.sha256(schema.encode()).hexdigest()
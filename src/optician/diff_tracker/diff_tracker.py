@@ -1,4 +1,10 @@
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+
 from optician.db_client import DbClient
+from optician.profiler import span
 
 
 class DiffTracker:
@@ -9,24 +15,32 @@ class DiffTracker:
         db_client: DbClient = None,
         models: list = None,
         full_refresh: bool = False,
+        since: datetime = None,
     ):
         self.dataset1_name = dataset1_name
         self.dataset2_name = dataset2_name
         self.models = models
         self.db = db_client
         self.full_refresh = full_refresh
+        self.since = since
 
     def get_table_schemas(self, dataset_id: str):
-        # Get list of tables in dataset that are also in models
-        table_schemas = {}
-        for table in self.db.list_tables(dataset_id):
-            table_id = table.name
-            if table_id in self.models:
-                table_schemas[table_id] = table
+        # Get list of tables in dataset that are also in models, and only fetch
+        # the schemas of those, through the schema cache of the client
+        with span("diff.get_table_schemas", dataset=dataset_id):
+            table_ids = [
+                table_id
+                for table_id in self.db.list_table_ids(dataset_id)
+                if table_id in self.models
+            ]
+            tables = self.db.get_tables(dataset_id, table_ids)
 
-        return table_schemas
+        return dict(zip(table_ids, tables))
 
     def get_diff_tables(self):
+        if self.since is not None and not self.full_refresh:
+            return self.get_diff_tables_since()
+
         results = {"new_models": [], "diff_models": [], "missing_models": []}
 
         # Get table schemas for dataset1
@@ -41,16 +55,120 @@ class DiffTracker:
         dataset2_schemas = self.get_table_schemas(self.dataset2_name)
 
         # Compare schemas
-        for table_name, schema1 in dataset1_schemas.items():
-            if table_name in dataset2_schemas:
-                schema2 = dataset2_schemas[table_name]
-                if schema1 != schema2:
-                    results["diff_models"].append(table_name)
-            else:
-                results["new_models"].append(table_name)
+        with span("diff.compare"):
+            for table_name, schema1 in dataset1_schemas.items():
+                if table_name in dataset2_schemas:
+                    schema2 = dataset2_schemas[table_name]
+                    if schema1 != schema2:
+                        results["diff_models"].append(table_name)
+                else:
+                    results["new_models"].append(table_name)
 
         for table_name in dataset2_schemas:
             if table_name not in dataset1_schemas:
                 results["missing_models"].append(table_name)
 
         return results
+
+    def get_diff_tables_since(self):
+        """Only compare the schemas of the models modified in dataset1 since the cutoff.
+
+        New and missing models are found from the table metadata, so they are
+        reported whether they have been modified or not.
+        """
+        results = {"new_models": [], "diff_models": [], "missing_models": []}
+
+        dataset1_modified = self.db.get_tables_last_modified(self.dataset1_name)
+        dataset2_modified = self.db.get_tables_last_modified(self.dataset2_name)
+
+        changed_models = []
+        for table_name in self.models:
+            if table_name not in dataset1_modified:
+                if table_name in dataset2_modified:
+                    results["missing_models"].append(table_name)
+            elif table_name not in dataset2_modified:
+                results["new_models"].append(table_name)
+            elif dataset1_modified[table_name] > self.since:
+                changed_models.append(table_name)
+
+        # Fetch the schemas of the changed models only. Passing the modification
+        # times makes a schema cache fetch the tables modified since they were cached
+        dataset1_schemas = self.db.get_tables(
+            self.dataset1_name, changed_models, last_modified=dataset1_modified
+        )
+        dataset2_schemas = self.db.get_tables(
+            self.dataset2_name, changed_models, last_modified=dataset2_modified
+        )
+
+        with span("diff.compare"):
+            for table_name, schema1, schema2 in zip(
+                changed_models, dataset1_schemas, dataset2_schemas
+            ):
+                if schema1 != schema2:
+                    results["diff_models"].append(table_name)
+
+        return results
+
+
+def parse_timestamp(value: str):
+    # Timestamps without a timezone are assumed to be in UTC
+    timestamp = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
+
+
+def _read_state(state_file: str):
+    if not os.path.exists(state_file):
+        return {}
+    with open(state_file, "r") as file:
+        return json.load(file)
+
+
+def _write_state(state_file: str, state: dict):
+    # Write to a temporary file first, so an interrupted run can't corrupt the state
+    state_dir = os.path.dirname(os.path.abspath(state_file))
+    os.makedirs(state_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", dir=state_dir, delete=False) as file:
+        json.dump(state, file, indent=2)
+    os.replace(file.name, state_file)
+
+
+def read_last_run(state_file: str, key: str):
+    """Return the time of the last successful run stored for key, or None."""
+    last_runs = _read_state(state_file).get("last_runs", {})
+    if key not in last_runs:
+        return None
+    return parse_timestamp(last_runs[key])
+
+
+def write_last_run(
+    state_file: str, key: str, timestamp: datetime, pending: bool = False
+):
+    """Store the time of a successful run for key.
+
+    Args:
+        state_file (str): Path of the state file.
+        key (str): Key of the run, e.g. the project and datasets compared.
+        timestamp (datetime): Time the run started.
+        pending (bool): Only store the time as pending, e.g. until the views are
+            generated and pushed. It is used by --since last-run once committed
+            with commit_pending_runs.
+    """
+    state = _read_state(state_file)
+    runs = "pending_runs" if pending else "last_runs"
+    state.setdefault(runs, {})[key] = timestamp.isoformat()
+    if not pending:
+        state.get("pending_runs", {}).pop(key, None)
+    _write_state(state_file, state)
+
+
+def commit_pending_runs(state_file: str):
+    """Make the pending run times the last runs, and return their keys."""
+    state = _read_state(state_file)
+    pending_runs = state.pop("pending_runs", {})
+    if not pending_runs:
+        return []
+    state.setdefault("last_runs", {}).update(pending_runs)
+    _write_state(state_file, state)
+    return list(pending_runs)
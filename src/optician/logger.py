@@ -1,6 +1,133 @@
+import atexit
+import json
 import logging
-from logging.handlers import TimedRotatingFileHandler
 import os
+import queue
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+
+LOGGER_NAME = "optician"
+DEFAULT_LOG_FILE = os.path.join("logs", "optician.log")
+
+# Extra fields carried by the records, e.g.
+# logger.info("View written", extra={"table": "deals", "phase": "lookml.write"})
+STRUCTURED_FIELDS = ("table", "phase", "duration")
+
+CONSOLE_FORMAT = "%(message)s"
+FILE_FORMAT = (
+    "[%(asctime)s] - [%(levelname)s] - %(module)s - %(funcName)s -  %(message)s"
+)
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        log = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "module": record.module,
+            "function": record.funcName,
+            "message": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            if hasattr(record, field):
+                log[field] = getattr(record, field)
+        if record.exc_info:
+            log["exception"] = self.formatException(record.exc_info)
+        return json.dumps(log, default=str)
+
+
+class LazyQueueHandler(QueueHandler):
+    # The default QueueHandler formats the message in the calling thread.
+    # Leave the record untouched so the listener thread does the formatting.
+    def prepare(self, record):
+        return record
+
+
+def get_logger():
+    """Return the optician logger.
+
+    No file is opened here, so it is safe to call at import time. Until
+    configure_logging is called, INFO messages are written to the console.
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    if not logger.handlers:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        logger.addHandler(console_handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+def configure_logging(
+    level: str = "INFO",
+    log_file: str = None,
+    log_format: str = "text",
+    log_to_console: bool = True,
+):
+    """Send the optician logs through a queue to the console and a log file.
+
+    The handlers run in a background thread, so logging calls don't wait for the
+    disk or the console.
+
+    Args:
+        level (str): Level of the console logs. The log file gets all DEBUG logs.
+        log_file (str): Path of the log file, rotated daily. No file if None.
+        log_format (str): "text" or "json" (one JSON object per line, with the
+            table, phase and duration fields when available).
+        log_to_console (bool): Whether to write the logs to the console.
+    """
+    global _listener
+    stop_logging()
+
+    json_formatter = JsonFormatter() if log_format == "json" else None
+    handlers = []
+    if log_to_console:
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(level)
+        console_handler.setFormatter(
+            json_formatter or logging.Formatter(CONSOLE_FORMAT)
+        )
+        handlers.append(console_handler)
+
+    if log_file:
+        log_folder = os.path.dirname(log_file)
+        if log_folder and not os.path.exists(log_folder):
+            os.makedirs(log_folder)
+        file_handler = TimedRotatingFileHandler(
+            filename=log_file, when="D", interval=1, backupCount=5
+        )
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(json_formatter or logging.Formatter(FILE_FORMAT))
+        handlers.append(file_handler)
+
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger(LOGGER_NAME)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    logger.addHandler(LazyQueueHandler(log_queue))
+    # Filter records before they are queued, so filtered out calls are cheap
+    logger.setLevel(logging.DEBUG if log_file else level)
+    logger.propagate = False
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return logger
+
+
+def stop_logging():
+    # Flush the queued records and stop the background thread
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
 
 
 class Logger:
@@ -11,41 +138,12 @@ class Logger:
         log_to_console=True,
         log_to_file=True,
     ):
-        self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(logging.DEBUG)
+        # Kept for backwards compatibility, prefer get_logger and configure_logging
         self.log_to_console = log_to_console
         self.log_to_file = log_to_file
         self.log_file = os.path.join(log_folder, log_file)
 
-        if self.log_to_file:
-            if not os.path.exists(log_folder):
-                os.makedirs(log_folder)
-
     def get_logger(self):
-        # Check if console handler already exists
-        if self.log_to_console and not any(
-            isinstance(handler, logging.StreamHandler)
-            for handler in self.logger.handlers
-        ):
-            console_formatter = logging.Formatter("%(message)s")
-            console_handler = logging.StreamHandler()
-            console_handler.setLevel(logging.INFO)
-            console_handler.setFormatter(console_formatter)
-            self.logger.addHandler(console_handler)
-
-        # Check if file handler already exists
-        if self.log_to_file and not any(
-            isinstance(handler, TimedRotatingFileHandler)
-            for handler in self.logger.handlers
-        ):
-            file_formatter = logging.Formatter(
-                "[%(asctime)s] - [%(levelname)s] - %(module)s - %(funcName)s -  %(message)s"
-            )
-            file_handler = TimedRotatingFileHandler(
-                filename=self.log_file, when="D", interval=1, backupCount=5
-            )
-            file_handler.setLevel(logging.DEBUG)
-            file_handler.setFormatter(file_formatter)
-            self.logger.addHandler(file_handler)
-
-        return self.logger
+        # Don't configure the logging here: callers create a Logger at import time,
+        # which would replace the handlers configured for the command
+        return get_logger()
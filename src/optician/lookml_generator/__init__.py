@@ -1 +1,2 @@
 from .lookml_generator import *
+from .rules import *
@@ -1,9 +1,20 @@
 from optician.db_client import db_client as db
 import os
 import json
-from optician.logger import Logger
-
-CONSOLE_LOGGER = Logger().get_logger()
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from optician.logger import get_logger
+from optician.profiler import span
+from optician.lookml_generator.rules import CompiledRules, TableRules
+from optician.sinks import DirectorySink, ViewSink
+from optician.checkpoint import (
+    CheckpointJournal,
+    get_content_fingerprint,
+    get_file_fingerprint,
+)
+
+CONSOLE_LOGGER = get_logger()
 
 FIELD_TYPE_MAPPING = {
     "bigquery": {
@@ -48,6 +59,7 @@ CONFIG_OPTIONS = {
     "timeframes": {"type": list, "subtype": str},
     "time_suffixes": {"type": list, "subtype": str},
     "order_by": {"type": str, "options": ["alpha", "table"]},
+    "rules": {"type": list, "subtype": dict},
 }
 
 
@@ -56,6 +68,13 @@ class Config:
         self._config_file_path = config_file_path
         self._custom_config = self._read_custom_config()
         self._test_config()
+        self.compiled_rules = CompiledRules(
+            primary_key_columns=self.get_property("primary_key_columns", []),
+            ignore_column_types=self.get_property("ignore_column_types", []),
+            ignore_modes=self.get_property("ignore_modes", []),
+            time_suffixes=self.get_property("time_suffixes", []),
+            rules=self.get_property("rules", []),
+        )
 
     def _read_custom_config(self):
         if self._config_file_path is None:
@@ -66,6 +85,10 @@ class Config:
             except:
                 raise Exception("Invalid config file path")
 
+    def fingerprint(self):
+        config = json.dumps(self._custom_config, sort_keys=True)
+        return hashlib.sha256(config.encode()).hexdigest()
+
     def get_property(self, property_name, default_value=None):
         if property_name in self._custom_config.keys():
             return self._custom_config.get(property_name)
@@ -99,22 +122,57 @@ class Config:
                     )
 
 
+class RenderCache:
+    def __init__(self):
+        """Cache of rendered LookML fields, shared between LookMLGenerator instances.
+
+        Tables with the same schema fingerprint rendered with the same config produce
+        the same fields, so they are only rendered once.
+        """
+        self._renders = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            render = self._renders.get(key)
+            if render is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return render
+
+    def set(self, key, render: str):
+        with self._lock:
+            self._renders[key] = render
+
+
 class LookMLGenerator:
-    def __init__(self, client: db.DbClient, dataset_id: str):
+    def __init__(
+        self,
+        client: db.DbClient,
+        dataset_id: str,
+        config: Config = None,
+        render_cache: RenderCache = None,
+        sink: ViewSink = None,
+    ):
         self.client = client
         self.dataset_id = dataset_id
         self._config_file_env_name = "OPTICIAN_CONFIG_FILE"
-        self.config = Config(os.getenv(self._config_file_env_name, None))
+        if config is None:
+            config = Config(os.getenv(self._config_file_env_name, None))
+        self.config = config
+        self.render_cache = render_cache
+        # Where the views are written: a directory, an archive or the standard output
+        self.sink = sink if sink is not None else DirectorySink()
         self.hide_all_fields = self.config.get_property("hide_all_fields", False)
-        self.primary_key_column_names = self.config.get_property(
-            "primary_key_columns", []
-        )
-        self.ignore_column_types = self.config.get_property("ignore_column_types", [])
-        self.ignore_modes = self.config.get_property("ignore_modes", [])
         self.timeframes = self.config.get_property("timeframes", DEFAULT_TIMEFRAMES)
-        self.time_suffixes = self.config.get_property("time_suffixes", [])
         self.order_by = self.config.get_property("order_by", "alpha")
         self.capitalize_ids = self.config.get_property("capitalize_ids", True)
+        # primary_key_columns, ignore_column_types, ignore_modes, time_suffixes and
+        # rules are compiled once per config, read them from the rules
+        self.rules = self.config.compiled_rules
 
     def _build_field_name(self, field_name: str):
         # remove underscores
@@ -139,9 +197,17 @@ class LookMLGenerator:
         tf += "    ]"
         return tf
 
-    def process_field(self, field: db.Field, parent_field_name: str = None):
+    def process_field(
+        self,
+        field: db.Field,
+        parent_field_name: str = None,
+        table_rules: TableRules = None,
+        parent_field_path: str = None,
+    ):
         field_name = field.name
         field_sql_name = field_name
+        # Dotted path of the column from the top-level column, matched by the rules
+        field_path = field_name
         field_type = field.internal_type
         lookml_type = self._get_looker_type(field)
         is_nested_field = self.client.is_nested_field(field)
@@ -153,6 +219,7 @@ class LookMLGenerator:
         group_label = ""
         group_item_label = ""
         hidden = ""
+        label = ""
         view_field = ""
 
         if field_type == "DATE":
@@ -170,26 +237,35 @@ class LookMLGenerator:
 
         if parent_field_name:
             field_sql_name = parent_field_name + "." + field_name
+            field_path = (parent_field_path or parent_field_name) + "." + field_name
             group_item_label = (
                 f'group_item_label: "{self._build_field_name(field_name)}"'
             )
             field_name = parent_field_name + "__" + field_name
             group_label = f'group_label: "{self._build_field_name(parent_field_name)}"'
 
-        elif field_name in self.primary_key_column_names:
+        elif field_name in self.rules.primary_key_columns:
             pk = "primary_key: yes"
 
         if self.hide_all_fields:
             hidden = "hidden: yes"
 
+        # Apply the rules of the table to the column, they override the global options
+        actions = table_rules.get_actions(field_path) if table_rules else {}
+        if "primary_key" in actions:
+            pk = "primary_key: yes" if actions["primary_key"] else ""
+        if "hidden" in actions:
+            hidden = "hidden: yes" if actions["hidden"] else ""
+        if "label" in actions:
+            label = 'label: "' + actions["label"].replace('"', "'") + '"'
+        lookml_type = actions.get("type", lookml_type)
+
         # Don't write these fields
-        if field_mode is not None:
-            if field_mode in self.ignore_modes:
-                return ""
+        if field_mode in self.rules.ignore_modes:
+            return ""
 
-        if self.ignore_column_types:
-            if field_type in self.ignore_column_types:
-                return ""
+        if field_type in self.rules.ignore_column_types:
+            return ""
 
         # Handle nested fields
         if is_nested_field:
@@ -202,7 +278,10 @@ class LookMLGenerator:
             for nested_field in nested_fields:
                 # Recursively process the nested field
                 nested_output += self.process_field(
-                    nested_field, parent_field_name=f"{field_name}"
+                    nested_field,
+                    parent_field_name=f"{field_name}",
+                    table_rules=table_rules,
+                    parent_field_path=field_path,
                 )
             return nested_output
 
@@ -210,15 +289,13 @@ class LookMLGenerator:
         elif lookml_type == "time":
             timeframes = self._build_timeframes()
             # if field name ends with _at, _time, or _date
-            if len(self.time_suffixes) > 0:
-                for s in self.time_suffixes:
-                    if field_name.endswith(s):
-                        # split field name on underscore and remove last part
-                        field_name = "_".join(field_name.split("_")[:-1])
-                        break
+            if self.rules.has_time_suffix(field_name):
+                # split field name on underscore and remove last part
+                field_name = "_".join(field_name.split("_")[:-1])
 
             view_field = f"  dimension_group: {field_name} {{\n"
             view_field += f"    {hidden}\n"
+            view_field += f"    {label}\n"
             view_field += f"    description: {field_description}\n"
             view_field += f"    type: time\n"
             view_field += f"    {timeframes}\n"
@@ -232,6 +309,7 @@ class LookMLGenerator:
             view_field = f"  dimension: {field_name} {{\n"
             view_field += f"    {hidden}\n"
             view_field += f"    {pk}\n"
+            view_field += f"    {label}\n"
             view_field += f"    {group_label}\n"
             view_field += f"    {group_item_label}\n"
             view_field += f"    description: {field_description}\n"
@@ -248,12 +326,48 @@ class LookMLGenerator:
 
         return view_field
 
+    def render_fields(self, table: db.Table):
+        with span("lookml.render", table=table.name):
+            return self._render_fields(table)
+
+    def _render_fields(self, table: db.Table):
+        table_rules = self.rules.for_table(table.name)
+
+        # The rendered fields only depend on the schema, the config and the rules
+        # of the table, so identical tables in different datasets share the render
+        if self.render_cache is not None:
+            key = (
+                self.client.db_type,
+                table.fingerprint(),
+                self.config.fingerprint(),
+                table_rules.key,
+            )
+            fields_output = self.render_cache.get(key)
+            if fields_output is not None:
+                return fields_output
+
+        # Sort the fields by name or leave them in the order they are in.
+        # The table may be shared through a schema cache, so don't mutate it.
+        schema = table.schema
+        if self.order_by == "alpha":
+            schema = sorted(schema, key=lambda x: x.name)
+
+        fields_output = "".join(
+            self.process_field(field, table_rules=table_rules) for field in schema
+        )
+
+        if self.render_cache is not None:
+            self.render_cache.set(key, fields_output)
+        return fields_output
+
     def generate_lookml_view(
         self,
         table_id: str,
         output_dir: str = None,
         view_name: str = None,
         override_dataset_id: str = None,
+        table: db.Table = None,
+        journal: CheckpointJournal = None,
     ):
         # Generate LookML view
         if not view_name:
@@ -267,38 +381,133 @@ class LookMLGenerator:
         view_output = f"view: {view_name} {{\n"
         view_output += f"  sql_table_name: `{sql_table_name}`;;\n"  # Include the SQL table name parameter
 
-        table = self.client.get_table(self.dataset_id, table_id)
+        if table is None:
+            table = self.client.get_table(self.dataset_id, table_id)
 
-        # Sort the fields by name or leave them in the order they are in
-        if self.order_by == "alpha":
-            table.schema = sorted(table.schema, key=lambda x: x.name)
-
-        for field in table.schema:
-            view_field = self.process_field(field)
-            view_output += view_field
+        view_output += self.render_fields(table)
         view_output += "\n}"
 
-        # Write the LookML view to a file
-        lookml_file_path = f"{view_name}.view.lkml"
-        if output_dir:
-            # create directory if it doesn't exist
-            # with all permissions
-            if not os.path.exists(output_dir):
-                os.mkdir(output_dir)
-
-            lookml_file_path = os.path.join(output_dir, lookml_file_path)
+        # Write the LookML view to the sink, output_dir is relative to the sink
+        lookml_file_name = self.get_lookml_file_path(view_name, output_dir)
+        with span("lookml.write", table=table_id):
+            lookml_file_path = self.sink.write(lookml_file_name, view_output)
 
-        with open(lookml_file_path, "w") as file:
-            file.write(view_output)
+        if journal is not None:
+            journal.record(table_id, get_content_fingerprint(view_output))
 
-        CONSOLE_LOGGER.info(f"LookML view written to {lookml_file_path}")
+        CONSOLE_LOGGER.info(
+            "LookML view written to %s",
+            lookml_file_path,
+            extra={"table": table_id, "phase": "lookml.write"},
+        )
+        return lookml_file_path
 
     def generate_batch_lookml_views(
-        self, tables: list, output_dir: str = None, override_dataset_id: str = None
+        self,
+        tables: list,
+        output_dir: str = None,
+        override_dataset_id: str = None,
+        max_workers: int = 8,
+        journal: CheckpointJournal = None,
+        executor: ThreadPoolExecutor = None,
     ):
-        for table in tables:
-            self.generate_lookml_view(
+        lookml_file_paths = []
+        if journal is not None:
+            # Skip the views completed by a previous run and left unchanged since
+            pending_tables = []
+            for table in tables:
+                lookml_file_path = self.get_lookml_file_path(table, output_dir)
+                fingerprint = get_file_fingerprint(lookml_file_path)
+                if journal.is_completed(table, fingerprint):
+                    lookml_file_paths.append(lookml_file_path)
+                else:
+                    pending_tables.append(table)
+            if lookml_file_paths:
+                CONSOLE_LOGGER.info(
+                    "Skipping %s views completed by a previous run",
+                    len(lookml_file_paths),
+                )
+            tables = pending_tables
+
+        # Fetch the schemas concurrently, and write each view as soon as its schema
+        # is available
+        schemas = self.client.iter_tables(
+            self.dataset_id, tables, max_workers=max_workers, executor=executor
+        )
+        for table, schema in zip(tables, schemas):
+            lookml_file_path = self.generate_lookml_view(
                 table_id=table,
                 output_dir=output_dir,
                 override_dataset_id=override_dataset_id,
+                table=schema,
+                journal=journal,
             )
+            lookml_file_paths.append(lookml_file_path)
+        return lookml_file_paths
+
+    @staticmethod
+    def get_lookml_file_path(view_name: str, output_dir: str = None):
+        lookml_file_path = f"{view_name}.view.lkml"
+        if output_dir:
+            lookml_file_path = os.path.join(output_dir, lookml_file_path)
+        return lookml_file_path
+
+
+def generate_lookml_for_targets(
+    db_clients: dict,
+    targets: list,
+    tables: list,
+    output_dir: str = None,
+    override_dataset_id: str = None,
+    max_workers: int = 8,
+    sink: ViewSink = None,
+):
+    """Generate the LookML views of the same tables for many datasets at once.
+
+    Args:
+        db_clients (dict): Database clients by project ID, shared by all the targets
+            of the same project.
+        targets (list): List of (project ID, dataset ID) tuples.
+        tables (list): Table IDs to generate in every target.
+        output_dir (str): The views of each target are written to a sub-directory
+            named project.dataset.
+        override_dataset_id (str): Override Dataset ID for all the targets.
+        max_workers (int): Number of tables fetched concurrently, across all the
+            targets.
+        sink (ViewSink): Sink shared by all the targets, e.g. an archive.
+
+    Returns:
+        dict: LookML file paths by target.
+    """
+    config = Config(os.getenv("OPTICIAN_CONFIG_FILE", None))
+    render_cache = RenderCache()
+
+    def generate_target(target):
+        project, dataset = target
+        lookml = LookMLGenerator(
+            db_clients[project],
+            dataset,
+            config=config,
+            render_cache=render_cache,
+            sink=sink,
+        )
+        return lookml.generate_batch_lookml_views(
+            tables=tables,
+            output_dir=os.path.join(output_dir or "", f"{project}.{dataset}"),
+            override_dataset_id=override_dataset_id,
+            executor=db_executor,
+        )
+
+    # The targets only wait for their schemas and render them, the database calls
+    # of all the targets go through one shared pool of max_workers threads
+    with ThreadPoolExecutor(max_workers=max_workers) as db_executor:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = dict(zip(targets, executor.map(generate_target, targets)))
+
+    CONSOLE_LOGGER.info(
+        "Generated %s views for %s targets, %s distinct schemas rendered",
+        render_cache.hits + render_cache.misses,
+        len(targets),
+        render_cache.misses,
+    )
+    return results
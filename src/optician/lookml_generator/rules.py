@@ -0,0 +1,221 @@
+import re
+import threading
+
+RULE_ACTIONS = {
+    "primary_key": bool,
+    "hidden": bool,
+    "type": str,
+    "label": str,
+}
+
+# LookML types a dimension can have with only a sql parameter. time is written as a
+# dimension_group. Types that need other parameters, e.g. tier or distance, or
+# that only apply to a dimension_group, e.g. duration, are not supported.
+LOOKML_DIMENSION_TYPES = frozenset(
+    [
+        "string",
+        "number",
+        "yesno",
+        "zipcode",
+        "time",
+        "date",
+        "date_time",
+        "date_raw",
+        "date_microsecond",
+        "date_millisecond",
+        "date_second",
+        "date_minute",
+        "date_hour",
+        "date_hour_of_day",
+        "date_time_of_day",
+        "date_day_of_week",
+        "date_day_of_week_index",
+        "date_day_of_month",
+        "date_day_of_year",
+        "date_week",
+        "date_week_of_year",
+        "date_month",
+        "date_month_name",
+        "date_month_num",
+        "date_quarter",
+        "date_quarter_of_year",
+        "date_year",
+        "date_fiscal_month_num",
+        "date_fiscal_quarter",
+        "date_fiscal_quarter_of_year",
+        "date_fiscal_year",
+    ]
+)
+
+
+def _compile_names(names, rule_name: str):
+    # A string is a regular expression matching the whole name, a list exact names
+    if isinstance(names, str):
+        try:
+            return re.compile(names)
+        except re.error as e:
+            raise Exception(f"Invalid regular expression in {rule_name}: {e}")
+    if isinstance(names, list) and all(isinstance(n, str) for n in names):
+        return frozenset(names)
+    raise Exception(
+        f"Invalid {rule_name}. Expected a regular expression or a list of names"
+    )
+
+
+def _matches(names, name: str):
+    if isinstance(names, frozenset):
+        return name in names
+    return names.fullmatch(name) is not None
+
+
+class TableRules:
+    def __init__(self, key: tuple, rules: list):
+        """Rules that apply to the columns of a table.
+
+        Columns named in a list are resolved with a dict lookup. The regular
+        expressions are combined into a single one, so the columns that match no
+        rule are resolved with one regex match. The result is memoized for each
+        column, since the same column names repeat across tables.
+
+        Args:
+            key (tuple): Indexes of the rules, identifies tables with the same rules.
+            rules (list): Compiled rules as (columns, actions) tuples, in order.
+        """
+        self.key = key
+        self._exact_columns = {}
+        self._regex_rules = []
+        for position, (columns, actions) in enumerate(rules):
+            if isinstance(columns, frozenset):
+                for column in columns:
+                    self._exact_columns.setdefault(column, []).append(
+                        (position, actions)
+                    )
+            else:
+                self._regex_rules.append((position, columns, actions))
+        self._any_regex = None
+        if self._regex_rules:
+            patterns = [columns.pattern for _, columns, _ in self._regex_rules]
+            try:
+                self._any_regex = re.compile("|".join(f"(?:{p})" for p in patterns))
+            except re.error:
+                # e.g. patterns with global flags, which can't be combined
+                self._any_regex = None
+        self._resolved = {}
+        self._lock = threading.Lock()
+
+    def get_actions(self, column_name: str):
+        """Return the actions for a column, later rules taking precedence."""
+        actions = self._resolved.get(column_name)
+        if actions is not None:
+            return actions
+
+        matches = list(self._exact_columns.get(column_name, []))
+        if self._regex_rules and (
+            self._any_regex is None or self._any_regex.fullmatch(column_name)
+        ):
+            matches += [
+                (position, rule_actions)
+                for position, columns, rule_actions in self._regex_rules
+                if columns.fullmatch(column_name)
+            ]
+        actions = {}
+        for _, rule_actions in sorted(matches, key=lambda m: m[0]):
+            actions.update(rule_actions)
+
+        with self._lock:
+            self._resolved[column_name] = actions
+        return actions
+
+
+class CompiledRules:
+    def __init__(
+        self,
+        primary_key_columns: list = None,
+        ignore_column_types: list = None,
+        ignore_modes: list = None,
+        time_suffixes: list = None,
+        rules: list = None,
+    ):
+        """Config options compiled once for the field decisions.
+
+        Args:
+            primary_key_columns (list): Column names that are primary keys.
+            ignore_column_types (list): Column types that are not written.
+            ignore_modes (list): Column modes that are not written.
+            time_suffixes (list): Suffixes removed from the time field names.
+            rules (list): Per-table rules, e.g.
+                {"tables": "^fct_.*", "columns": ["amount"], "hidden": true}
+        """
+        self.primary_key_columns = frozenset(primary_key_columns or [])
+        self.ignore_column_types = frozenset(ignore_column_types or [])
+        self.ignore_modes = frozenset(ignore_modes or [])
+        self.time_suffix_regex = None
+        if time_suffixes:
+            self.time_suffix_regex = re.compile(
+                "(?:" + "|".join(re.escape(s) for s in time_suffixes) + ")$"
+            )
+
+        self._rules = [
+            self._compile_rule(index, rule) for index, rule in enumerate(rules or [])
+        ]
+        self._tables = {}
+        self._table_rules_by_key = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _compile_rule(index: int, rule: dict):
+        rule_name = f"rule {index}"
+        if not isinstance(rule, dict) or "columns" not in rule:
+            raise Exception(f"Invalid {rule_name}. Expected an object with columns")
+        tables = None
+        if "tables" in rule:
+            tables = _compile_names(rule["tables"], f"{rule_name} tables")
+        columns = _compile_names(rule["columns"], f"{rule_name} columns")
+
+        actions = {}
+        for action, value in rule.items():
+            if action in ("tables", "columns"):
+                continue
+            if action not in RULE_ACTIONS:
+                raise Exception(f"Invalid action {action} in {rule_name}")
+            if not isinstance(value, RULE_ACTIONS[action]):
+                raise Exception(
+                    f"Invalid type for {action} in {rule_name}. "
+                    f"Expected {RULE_ACTIONS[action]}"
+                )
+            if action == "type" and value not in LOOKML_DIMENSION_TYPES:
+                raise Exception(
+                    f"Invalid LookML type {value} in {rule_name}. "
+                    "Expected a dimension type, e.g. string, number, yesno or time"
+                )
+            actions[action] = value
+        return tables, columns, actions
+
+    def has_time_suffix(self, field_name: str):
+        return (
+            self.time_suffix_regex is not None
+            and self.time_suffix_regex.search(field_name) is not None
+        )
+
+    def for_table(self, table_name: str):
+        """Return the TableRules of a table, resolved once per table name.
+
+        Tables to which the same rules apply share the same TableRules.
+        """
+        table_rules = self._tables.get(table_name)
+        if table_rules is not None:
+            return table_rules
+
+        key = tuple(
+            i
+            for i, (tables, _, _) in enumerate(self._rules)
+            if tables is None or _matches(tables, table_name)
+        )
+        with self._lock:
+            if key not in self._table_rules_by_key:
+                self._table_rules_by_key[key] = TableRules(
+                    key, [self._rules[i][1:] for i in key]
+                )
+            table_rules = self._table_rules_by_key[key]
+            self._tables[table_name] = table_rules
+        return table_rules
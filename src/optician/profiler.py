@@ -0,0 +1,180 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+
+from optician.logger import get_logger
+
+CONSOLE_LOGGER = get_logger()
+
+
+class _NullSpan:
+    # Shared no-op span returned when profiling is disabled
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ("profiler", "name", "args", "start")
+
+    def __init__(self, profiler, name: str, args: dict):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler._record(self, time.perf_counter())
+        return False
+
+
+class Profiler:
+    def __init__(self):
+        """Collects timing spans of the phases of a run.
+
+        Spans are named after their phase, e.g. db.get_table, and can carry
+        arguments such as the table name. When the profiler is disabled, span()
+        returns a shared no-op context manager, so instrumented code runs at
+        nearly full speed.
+        """
+        self.enabled = False
+        self._events = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._cprofile = None
+        self._thread_cprofiles = []
+
+    def enable(self, cprofile: bool = False):
+        self._events = []
+        self._origin = time.perf_counter()
+        if cprofile:
+            self._cprofile = cProfile.Profile()
+            self._thread_cprofiles = []
+            if sys.version_info < (3, 12):
+                # Before Python 3.12, cProfile only profiles the thread it is enabled
+                # in, so one is also started in each new thread, e.g. the executor
+                # threads fetching the schemas, and merged with the main one
+                threading.setprofile(self._start_thread_cprofile)
+            self._cprofile.enable()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        if self._cprofile is not None:
+            threading.setprofile(None)
+            self._cprofile.disable()
+
+    def _start_thread_cprofile(self, frame, event, arg):
+        # Called on the first event of a new thread, enabling the profiler of the
+        # thread replaces this profile function
+        profile = cProfile.Profile()
+        with self._lock:
+            self._thread_cprofiles.append(profile)
+        profile.enable()
+
+    def span(self, name: str, **args):
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name, args)
+
+    def _record(self, span: Span, end: float):
+        event = (span.name, span.start, end, threading.get_ident(), span.args)
+        with self._lock:
+            self._events.append(event)
+        if CONSOLE_LOGGER.isEnabledFor(logging.DEBUG):
+            CONSOLE_LOGGER.debug(
+                "%s took %.3fs",
+                span.name,
+                end - span.start,
+                extra={"phase": span.name, "duration": end - span.start, **span.args},
+            )
+
+    def get_phase_summary(self):
+        summary = {}
+        for name, start, end, _, _ in self._events:
+            phase = summary.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+            phase["count"] += 1
+            phase["total"] += end - start
+            phase["max"] = max(phase["max"], end - start)
+        return summary
+
+    def get_table_summary(self):
+        summary = {}
+        for name, start, end, _, args in self._events:
+            if "table" not in args:
+                continue
+            table = summary.setdefault(args["table"], {})
+            table[name] = table.get(name, 0.0) + end - start
+        return summary
+
+    def report(self, max_tables: int = 20):
+        lines = ["Time per phase:"]
+        lines.append(f"  {'phase':<30} {'count':>7} {'total (s)':>10} {'max (s)':>10}")
+        phases = self.get_phase_summary()
+        for name, phase in sorted(phases.items(), key=lambda p: -p[1]["total"]):
+            lines.append(
+                f"  {name:<30} {phase['count']:>7} "
+                f"{phase['total']:>10.3f} {phase['max']:>10.3f}"
+            )
+
+        tables = self.get_table_summary()
+        if tables:
+            lines.append(f"Slowest tables (top {max_tables}):")
+            by_total = sorted(tables.items(), key=lambda t: -sum(t[1].values()))
+            for table, table_phases in by_total[:max_tables]:
+                details = ", ".join(
+                    f"{name} {total:.3f}s" for name, total in table_phases.items()
+                )
+                total = sum(table_phases.values())
+                lines.append(f"  {table}: {total:.3f}s ({details})")
+        return "\n".join(lines)
+
+    def write_chrome_trace(self, file_path: str):
+        """Write the spans in the Chrome trace format (chrome://tracing, Perfetto)."""
+        pid = os.getpid()
+        trace_events = [
+            {
+                "name": name,
+                "cat": name.split(".")[0],
+                "ph": "X",
+                "ts": (start - self._origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": pid,
+                "tid": tid,
+                "args": {k: str(v) for k, v in args.items()},
+            }
+            for name, start, end, tid, args in self._events
+        ]
+        with open(file_path, "w") as file:
+            json.dump({"traceEvents": trace_events}, file)
+
+    def dump_stats(self, file_path: str):
+        if self._cprofile is None:
+            raise Exception("cProfile was not enabled for this run")
+        stats = pstats.Stats(self._cprofile)
+        with self._lock:
+            for profile in self._thread_cprofiles:
+                stats.add(profile)
+        stats.dump_stats(file_path)
+
+
+PROFILER = Profiler()
+
+
+def span(name: str, **args):
+    """Time a phase of the run, e.g. `with span("db.get_table", table=table_id):`"""
+    return PROFILER.span(name, **args)
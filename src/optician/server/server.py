@@ -0,0 +1,340 @@
+import http.client
+import ipaddress
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from optician.db_client import DbClient, SchemaCache
+from optician.diff_tracker import DiffTracker, parse_timestamp
+from optician.lookml_generator import Config, LookMLGenerator
+from optician.logger import get_logger
+
+CONSOLE_LOGGER = get_logger()
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_SCHEMA_TTL = 300
+UNIX_SOCKET_PREFIX = "unix://"
+
+REQUIRED_PARAMETERS = {
+    "/diff": ["db_type", "project", "dataset1_name", "dataset2_name", "models"],
+    "/generate": ["db_type", "project", "dataset", "tables"],
+    "/push": ["token", "repo", "input_dir", "output_dir", "branch_name"],
+    "/cache/clear": [],
+}
+
+
+class ClientPool:
+    def __init__(self, schema_ttl: float = DEFAULT_SCHEMA_TTL):
+        """Pool of warm clients shared between the requests of the server.
+
+        Args:
+            schema_ttl (float): Number of seconds table schemas are cached for.
+        """
+        self.schema_cache = SchemaCache(ttl=schema_ttl)
+        self._db_clients = {}
+        self._github_clients = {}
+        self._configs = {}
+        self._lock = threading.Lock()
+
+    def get_db_client(self, db_type: str, credentials: dict):
+        key = (db_type, tuple(sorted(credentials.items())))
+        with self._lock:
+            if key not in self._db_clients:
+                self._db_clients[key] = DbClient(
+                    db_type=db_type,
+                    credentials=credentials,
+                    schema_cache=self.schema_cache,
+                )
+            return self._db_clients[key]
+
+    def get_github_client(
+        self,
+        token: str,
+        repo: str,
+        user_email: str = None,
+        cache_dir: str = None,
+        api_url: str = None,
+    ):
+        # Imported here, since PyGithub takes long to import and the clients of
+        # the server only need request_server
+        from optician.vc_client import DEFAULT_GITHUB_API_URL, GithubClient
+
+        key = (token, repo, user_email, cache_dir, api_url)
+        with self._lock:
+            if key not in self._github_clients:
+                self._github_clients[key] = GithubClient(
+                    token=token,
+                    repo=repo,
+                    user_email=user_email,
+                    cache_dir=cache_dir,
+                    base_url=api_url or DEFAULT_GITHUB_API_URL,
+                )
+            return self._github_clients[key]
+
+    def get_config(self):
+        # Only parse the config file again if it has been modified
+        config_file_path = os.getenv("OPTICIAN_CONFIG_FILE", None)
+        mtime = None
+        if config_file_path and os.path.exists(config_file_path):
+            mtime = os.path.getmtime(config_file_path)
+        key = (config_file_path, mtime)
+        with self._lock:
+            if key not in self._configs:
+                self._configs = {key: Config(config_file_path)}
+            return self._configs[key]
+
+
+class OpticianServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, server_address, pool: ClientPool):
+        super().__init__(server_address, OpticianRequestHandler)
+        self.pool = pool
+
+
+class OpticianUnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, pool: ClientPool):
+        """Server listening on a unix socket only accessible to the current user."""
+        if os.path.exists(socket_path) and stat.S_ISSOCK(os.stat(socket_path).st_mode):
+            # Left behind by a server that didn't shut down cleanly
+            os.remove(socket_path)
+        # Create the socket without permissions for the group and the others
+        umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, OpticianRequestHandler)
+        finally:
+            os.umask(umask)
+        self.pool = pool
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+class OpticianRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/stats":
+            self._send_json(200, self.server.pool.schema_cache.get_stats())
+        else:
+            self._send_json(404, {"error": f"Unknown endpoint {self.path}"})
+
+    def do_POST(self):
+        endpoints = {
+            "/diff": self._diff,
+            "/generate": self._generate,
+            "/push": self._push,
+            "/cache/clear": self._clear_cache,
+        }
+        if self.path not in endpoints:
+            self._send_json(404, {"error": f"Unknown endpoint {self.path}"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "Invalid JSON payload"})
+            return
+
+        missing = [p for p in REQUIRED_PARAMETERS[self.path] if p not in payload]
+        if missing:
+            self._send_json(400, {"error": f"Missing parameters: {missing}"})
+            return
+
+        try:
+            response = endpoints[self.path](payload)
+        except Exception as e:
+            CONSOLE_LOGGER.exception("Request to %s failed", self.path)
+            self._send_json(500, {"error": str(e)})
+        else:
+            self._send_json(200, response)
+
+    def log_message(self, format, *args):
+        CONSOLE_LOGGER.debug(format, *args)
+
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _get_db_client(self, payload: dict):
+        credentials = {
+            "service_account": payload.get("service_account", None),
+            "project_id": payload["project"],
+            # Add other credentials for other databases here
+        }
+        return self.server.pool.get_db_client(payload["db_type"], credentials)
+
+    def _diff(self, payload: dict):
+        since = payload.get("since", None)
+        db_client = self._get_db_client(payload)
+        if payload.get("refresh", False):
+            for dataset_id in (payload["dataset1_name"], payload["dataset2_name"]):
+                db_client.invalidate_tables(dataset_id, payload["models"])
+        dt = DiffTracker(
+            dataset1_name=payload["dataset1_name"],
+            dataset2_name=payload["dataset2_name"],
+            db_client=db_client,
+            models=payload["models"],
+            full_refresh=payload.get("full_refresh", False),
+            since=parse_timestamp(since) if since else None,
+        )
+        return dt.get_diff_tables()
+
+    def _generate(self, payload: dict):
+        db_client = self._get_db_client(payload)
+        if payload.get("refresh", False):
+            db_client.invalidate_tables(payload["dataset"], payload["tables"])
+        lookml = LookMLGenerator(
+            db_client,
+            payload["dataset"],
+            config=self.server.pool.get_config(),
+        )
+        views = lookml.generate_batch_lookml_views(
+            tables=payload["tables"],
+            output_dir=payload.get("output_dir", None),
+            override_dataset_id=payload.get("override_dataset_id", None),
+            max_workers=payload.get("max_workers", 8),
+        )
+        return {"views": views}
+
+    def _push(self, payload: dict):
+        G = self.server.pool.get_github_client(
+            token=payload["token"],
+            repo=payload["repo"],
+            user_email=payload.get("user_email", None),
+            cache_dir=payload.get("cache_dir", None),
+            api_url=payload.get("api_url", None),
+        )
+        G.update_files(
+            input_dir=payload["input_dir"],
+            output_dir=payload["output_dir"],
+            target_branch=payload["branch_name"],
+            base_branch=payload.get("base_branch", "main"),
+        )
+        return {"status": "ok"}
+
+    def _clear_cache(self, payload: dict):
+        self.server.pool.schema_cache.clear()
+        return {"status": "ok"}
+
+
+def is_loopback_host(host: str):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def serve(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    schema_ttl: float = DEFAULT_SCHEMA_TTL,
+    socket_path: str = None,
+):
+    """Run the server until it is interrupted.
+
+    The server has no authentication, and the requests carry GitHub tokens and
+    output directories. It only listens on a loopback address, or on a unix
+    socket that only the current user can connect to.
+
+    Args:
+        host (str): Loopback address to listen on.
+        port (int): Port to listen on.
+        schema_ttl (float): Number of seconds table schemas are cached for.
+        socket_path (str): Path of a unix socket to listen on instead of host:port.
+    """
+    pool = ClientPool(schema_ttl=schema_ttl)
+    if socket_path:
+        server = OpticianUnixServer(socket_path, pool)
+        CONSOLE_LOGGER.info(
+            "Optician server listening on %s%s", UNIX_SOCKET_PREFIX, socket_path
+        )
+    else:
+        if not is_loopback_host(host):
+            raise ValueError(
+                f"Refusing to listen on {host}: the server has no authentication. "
+                "Use a loopback address or a unix socket"
+            )
+        server = OpticianServer((host, port), pool)
+        CONSOLE_LOGGER.info("Optician server listening on http://%s:%s", host, port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        CONSOLE_LOGGER.info("Shutting down optician server")
+    finally:
+        server.server_close()
+
+
+def request_server(server_url: str, endpoint: str, payload: dict):
+    """Send a request to a running optician server and return its JSON response.
+
+    Args:
+        server_url (str): Base URL of the server, e.g. http://127.0.0.1:8765, or
+            unix:// followed by the path of its unix socket
+        endpoint (str): Endpoint to call, e.g. /generate
+        payload (dict): Parameters of the command
+    """
+    if server_url.startswith(UNIX_SOCKET_PREFIX):
+        return _request_unix_server(
+            server_url[len(UNIX_SOCKET_PREFIX) :], endpoint, payload
+        )
+
+    request = urllib.request.Request(
+        server_url.rstrip("/") + endpoint,
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        error = json.loads(e.read() or b"{}").get("error", e.reason)
+        raise Exception(f"Optician server request to {endpoint} failed: {error}")
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str):
+        super().__init__("localhost")
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+def _request_unix_server(socket_path: str, endpoint: str, payload: dict):
+    connection = _UnixHTTPConnection(socket_path)
+    try:
+        connection.request(
+            "POST",
+            endpoint,
+            body=json.dumps(payload).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        response = connection.getresponse()
+        body = json.loads(response.read() or b"{}")
+    finally:
+        connection.close()
+    if response.status >= 400:
+        error = body.get("error", response.reason)
+        raise Exception(f"Optician server request to {endpoint} failed: {error}")
+    return body
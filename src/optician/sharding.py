@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import shutil
+
+from optician.logger import get_logger
+
+CONSOLE_LOGGER = get_logger()
+
+
+def parse_shard(shard: str):
+    """Parse a shard argument such as "2/4" into (index, count).
+
+    Shard indexes start at 1, so "1/4" to "4/4" cover all the tables.
+    """
+    try:
+        index, count = (int(n) for n in shard.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard {shard}. Expected i/N, e.g. 1/4")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Invalid shard {shard}. Expected 1 <= i <= N")
+    return index, count
+
+
+def get_shard_index(name: str, count: int):
+    # Stable across runs and machines, unlike the builtin hash()
+    digest = hashlib.sha1(name.encode()).hexdigest()
+    return int(digest[:8], 16) % count + 1
+
+
+def filter_shard(names: list, index: int, count: int):
+    return [name for name in names if get_shard_index(name, count) == index]
+
+
+def write_manifest(
+    manifest_path: str,
+    command: str,
+    index: int,
+    count: int,
+    results: dict = None,
+    views_dir: str = None,
+    views: list = None,
+):
+    """Write the partial result of a shard, to be combined with merge_manifests.
+
+    Args:
+        manifest_path (str): Path of the manifest file.
+        command (str): Command run by the shard (diff_tracker or generate_lookml).
+        index (int): Index of the shard.
+        count (int): Number of shards.
+        results (dict): Diff tracker results of the shard.
+        views_dir (str): Directory the views of the shard were written to.
+        views (list): Paths of the views of the shard.
+    """
+    manifest = {"command": command, "shard": [index, count]}
+    if results is not None:
+        manifest["results"] = results
+    if views is not None:
+        # Paths relative to the manifest, so shards can be moved between machines
+        manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+        views_dir = os.path.abspath(views_dir or os.getcwd())
+        manifest["views_dir"] = os.path.relpath(views_dir, manifest_dir)
+        manifest["views"] = [
+            os.path.relpath(os.path.abspath(view), views_dir) for view in views
+        ]
+
+    with open(manifest_path, "w") as file:
+        json.dump(manifest, file, indent=2)
+    CONSOLE_LOGGER.info(
+        "Shard %s/%s manifest written to %s", index, count, manifest_path
+    )
+
+
+def merge_manifests(manifest_paths: list, output_dir: str = None):
+    """Combine the manifests of all the shards of a command.
+
+    Args:
+        manifest_paths (list): Paths of the manifests of all the shards.
+        output_dir (str): Directory to copy the views of the shards to.
+
+    Returns:
+        dict: Combined diff tracker results, empty if the shards generated views.
+    """
+    manifests = []
+    for manifest_path in manifest_paths:
+        with open(manifest_path, "r") as file:
+            manifest = json.load(file)
+        manifest["path"] = manifest_path
+        manifests.append(manifest)
+
+    commands = {m["command"] for m in manifests}
+    counts = {m["shard"][1] for m in manifests}
+    if len(commands) != 1 or len(counts) != 1:
+        raise Exception("All manifests must come from the same command and shards")
+    count = counts.pop()
+    indexes = sorted(m["shard"][0] for m in manifests)
+    if indexes != list(range(1, count + 1)):
+        missing = sorted(set(range(1, count + 1)) - set(indexes))
+        raise Exception(
+            f"Expected one manifest for each of the {count} shards. Missing: {missing}"
+        )
+    manifests = sorted(manifests, key=lambda m: m["shard"][0])
+
+    results = {}
+    for manifest in manifests:
+        for key, models in manifest.get("results", {}).items():
+            results.setdefault(key, []).extend(models)
+
+    copied = set()
+    for manifest in manifests:
+        if "views" not in manifest:
+            continue
+        if output_dir is None:
+            raise Exception("An output directory is required to merge the views")
+        views_dir = os.path.join(
+            os.path.dirname(os.path.abspath(manifest["path"])), manifest["views_dir"]
+        )
+        for view in manifest["views"]:
+            if view in copied:
+                raise Exception(f"View {view} was generated by more than one shard")
+            copied.add(view)
+            source = os.path.join(views_dir, view)
+            destination = os.path.join(output_dir, view)
+            # The shards may have written their views to the output directory
+            if os.path.exists(destination) and os.path.samefile(source, destination):
+                continue
+            os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+            shutil.copyfile(source, destination)
+
+    if copied:
+        CONSOLE_LOGGER.info("%s views merged into %s", len(copied), output_dir)
+    return results
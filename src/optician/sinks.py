@@ -0,0 +1,226 @@
+import io
+import os
+import posixpath
+import sys
+import tarfile
+import threading
+import time
+import zipfile
+
+TAR_EXTENSIONS = {".tar": "", ".tar.gz": "gz", ".tgz": "gz"}
+ZIP_EXTENSIONS = (".zip",)
+STREAM_PATH = "-"
+
+
+def _get_tar_compression(path: str):
+    for extension, compression in TAR_EXTENSIONS.items():
+        if path.endswith(extension):
+            return compression
+    return None
+
+
+class ViewSink:
+    """Destination of the generated LookML views.
+
+    Views are written with a file name relative to the sink, which can contain
+    sub-directories, e.g. project.dataset/deals.view.lkml. Sinks can be shared
+    between threads.
+    """
+
+    def write(self, name: str, content: str):
+        """Write a view and return where it was written."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def abort(self):
+        """Stop writing after a failure, without completing the output."""
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class DirectorySink(ViewSink):
+    def __init__(self, output_dir: str = None):
+        """Write each view to its own file, in output_dir or the current directory."""
+        self.output_dir = output_dir
+        self._created_dirs = set()
+        self._lock = threading.Lock()
+
+    def write(self, name: str, content: str):
+        file_path = os.path.join(self.output_dir, name) if self.output_dir else name
+        directory = os.path.dirname(file_path)
+        if directory and directory not in self._created_dirs:
+            # create directory if it doesn't exist
+            os.makedirs(directory, exist_ok=True)
+            with self._lock:
+                self._created_dirs.add(directory)
+        with open(file_path, "w") as file:
+            file.write(content)
+        return file_path
+
+
+class TarSink(ViewSink):
+    def __init__(self, fileobj, compression: str = "", name: str = STREAM_PATH):
+        """Stream the views into a tar archive, written sequentially to fileobj."""
+        self.name = name
+        self._fileobj = fileobj
+        self._tar = tarfile.open(fileobj=fileobj, mode=f"w|{compression}")
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path: str):
+        return cls(open(path, "wb"), _get_tar_compression(path), name=path)
+
+    def write(self, name: str, content: str):
+        data = content.encode()
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        with self._lock:
+            self._tar.addfile(info, io.BytesIO(data))
+        return f"{self.name}:{name}"
+
+    def close(self):
+        self._tar.close()
+        self._close_fileobj()
+
+    def abort(self):
+        # Drop the buffered data and leave out the end-of-archive blocks, so readers
+        # fail on the truncated archive instead of taking it as complete. The
+        # stream is marked closed too, or it would flush itself when collected.
+        self._tar.closed = True
+        self._tar.fileobj.closed = True
+        self._close_fileobj()
+        if self.name != STREAM_PATH:
+            _remove(self.name)
+
+    def _close_fileobj(self):
+        if self._fileobj is not sys.stdout.buffer:
+            self._fileobj.close()
+        else:
+            self._fileobj.flush()
+
+
+class ZipSink(ViewSink):
+    def __init__(self, path: str):
+        """Write the views into a zip archive."""
+        self.name = path
+        self._zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+        self._lock = threading.Lock()
+
+    def write(self, name: str, content: str):
+        with self._lock:
+            self._zip.writestr(name, content)
+        return f"{self.name}:{name}"
+
+    def close(self):
+        self._zip.close()
+
+    def abort(self):
+        self._zip.close()
+        _remove(self.name)
+
+
+class StdoutSink(TarSink):
+    def __init__(self):
+        """Stream the views to the standard output as a tar archive."""
+        super().__init__(sys.stdout.buffer)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def is_directory_output(path: str):
+    return (
+        path != STREAM_PATH
+        and _get_tar_compression(path) is None
+        and not path.endswith(ZIP_EXTENSIONS)
+    )
+
+
+def open_sink(path: str = None):
+    """Return the sink for an output path.
+
+    Args:
+        path (str): "-" for the standard output, a path ending with .tar, .tar.gz,
+            .tgz or .zip for an archive, or an output directory otherwise.
+    """
+    if path == STREAM_PATH:
+        return StdoutSink()
+    if path and _get_tar_compression(path) is not None:
+        return TarSink.open(path)
+    if path and path.endswith(ZIP_EXTENSIONS):
+        return ZipSink(path)
+    return DirectorySink(path)
+
+
+def read_views(source: str):
+    """Yield the (file name, content) of the views of a directory, an archive or
+    of a tar archive streamed to the standard input ("-").
+
+    File names are relative to the directory or the root of the archive, with "/"
+    separators, e.g. project.dataset/deals.view.lkml for the views of a target.
+    """
+    names = set()
+    for name, content in _read_files(source):
+        name = _check_name(name, source)
+        if name in names:
+            raise Exception(f"File {name} appears more than once in {source}")
+        names.add(name)
+        yield name, content
+
+
+def _check_name(name: str, source: str):
+    # Don't let an archive write outside of the output directory
+    normalized = posixpath.normpath(name.replace(os.sep, "/"))
+    if (
+        posixpath.isabs(normalized)
+        or normalized == ".."
+        or normalized.startswith("../")
+    ):
+        raise Exception(f"Invalid file path {name} in {source}")
+    return normalized
+
+
+def _read_files(source: str):
+    if source == STREAM_PATH:
+        with tarfile.open(fileobj=sys.stdin.buffer, mode="r|*") as tar:
+            yield from _read_tar_members(tar, source)
+    elif os.path.isdir(source):
+        for directory, dir_names, file_names in os.walk(source):
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                file_path = os.path.join(directory, file_name)
+                with open(file_path, "r") as f:
+                    yield os.path.relpath(file_path, source), f.read()
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    yield info.filename, archive.read(info).decode()
+    else:
+        with tarfile.open(source, mode="r:*") as tar:
+            yield from _read_tar_members(tar, source)
+
+
+def _read_tar_members(tar, source: str):
+    for member in tar:
+        if member.isfile():
+            yield member.name, tar.extractfile(member).read().decode()
+    # tarfile stops silently at the end of the data, check that the archive ended
+    # with an end-of-archive block rather than being cut, e.g. by a failed run
+    if tar.fileobj.tell() - tar.offset < tarfile.BLOCKSIZE:
+        raise Exception(f"Archive {source} is truncated")
@@ -1,22 +1,166 @@
+import base64
+import hashlib
+import json
 import os
+import posixpath
+import subprocess
+import tempfile
+import urllib.error
+import urllib.parse
+import urllib.request
 from github import Github, Auth, InputGitAuthor
 from github.GithubException import UnknownObjectException
-from optician.logger import Logger
+from optician.checkpoint import CheckpointJournal
+from optician.logger import get_logger
+from optician.sinks import read_views
+from optician.profiler import span
 
 
-CONSOLE_LOGGER = Logger().get_logger()
+CONSOLE_LOGGER = get_logger()
+
+DEFAULT_GITHUB_API_URL = "https://api.github.com"
+
+
+class HttpCache:
+    def __init__(self, cache_dir: str, max_entries: int = 1000):
+        """On-disk cache of HTTP responses validated with ETag/Last-Modified.
+
+        Args:
+            cache_dir (str): Directory to store the responses in, one file per URL.
+            max_entries (int): Maximum number of responses kept. The least recently
+                used ones are evicted first.
+        """
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry_path(self, url: str):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, url: str):
+        entry_path = self._entry_path(url)
+        try:
+            with open(entry_path, "r") as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        # Keep track of the last use for the eviction
+        os.utime(entry_path)
+        return entry
+
+    def set(self, url: str, etag: str, last_modified: str, body):
+        entry = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "body": body,
+        }
+        entry_path = self._entry_path(url)
+        with tempfile.NamedTemporaryFile(
+            "w", dir=self.cache_dir, suffix=".tmp", delete=False
+        ) as file:
+            json.dump(entry, file)
+        os.replace(file.name, entry_path)
+        self._evict()
+
+    def _evict(self):
+        entries = [
+            os.path.join(self.cache_dir, f)
+            for f in os.listdir(self.cache_dir)
+            if f.endswith(".json")
+        ]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=os.path.getmtime)
+        for entry_path in entries[: len(entries) - self.max_entries]:
+            try:
+                os.remove(entry_path)
+            except OSError:
+                pass
+
+    def get_hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def git_blob_sha(content: str):
+    # SHA used by git (and the GitHub contents API) to identify a file content
+    data = content.encode()
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
 
 
 class GithubClient:
-    def __init__(self, token: str, repo: str, user_email: str = None):
+    def __init__(
+        self,
+        token: str,
+        repo: str,
+        user_email: str = None,
+        cache_dir: str = None,
+        cache_max_entries: int = 1000,
+        base_url: str = DEFAULT_GITHUB_API_URL,
+    ):
         self.token = token
-        self.repo = repo
+        self.repo_name = repo
         self.user_email = user_email
-        # Create a GitHub API client using the access token
+        self.base_url = base_url.rstrip("/")
+        # Reads go through a conditional request cache, which saves rate limit
+        self.cache = HttpCache(cache_dir, cache_max_entries) if cache_dir else None
+        self._login = None
+        # Create a GitHub API client using the access token, used for the writes
         auth = Auth.Token(token)
-        g = Github(auth=auth)
-        self.repo = g.get_repo(repo)
-        self.user = g.get_user()
+        g = Github(auth=auth, base_url=self.base_url)
+        self.repo = g.get_repo(repo, lazy=True)
+
+    def _get(self, path: str, params: dict = None):
+        """GET a resource from the GitHub API, or None if it does not exist.
+
+        Cached responses are revalidated with If-None-Match/If-Modified-Since.
+        A 304 Not Modified response has no body and does not count against the
+        rate limit.
+        """
+        url = self.base_url + urllib.parse.quote(path)
+        if params:
+            url += "?" + urllib.parse.urlencode(params)
+        headers = {
+            "Authorization": f"Bearer {self.token}",
+            "Accept": "application/vnd.github+json",
+        }
+        cached = self.cache.get(url) if self.cache else None
+        if cached:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        request = urllib.request.Request(url, headers=headers)
+        with span("vc.get", path=path):
+            try:
+                with urllib.request.urlopen(request) as response:
+                    body = json.loads(response.read())
+                    etag = response.headers.get("ETag")
+                    last_modified = response.headers.get("Last-Modified")
+            except urllib.error.HTTPError as e:
+                if e.code == 304 and cached:
+                    self.cache.hits += 1
+                    return cached["body"]
+                if e.code == 404:
+                    return None
+                raise Exception(f"GitHub request to {path} failed: {e.code} {e.reason}")
+
+        if self.cache:
+            self.cache.misses += 1
+            if etag or last_modified:
+                self.cache.set(url, etag, last_modified, body)
+        return body
+
+    @property
+    def login(self):
+        if self._login is None:
+            self._login = self._get("/user")["login"]
+        return self._login
 
     def update_files(
         self,
@@ -26,61 +170,107 @@ class GithubClient:
         base_branch: str = "main",
         file_creation_message: str = None,
         file_update_message: str = None,
+        journal: CheckpointJournal = None,
     ):
         # Pass login as email, since it's required but not tested
         if not self.user_email:
-            self.user_email = self.user.login
-        author = InputGitAuthor(self.user.login, self.user_email)
-        branches = self.repo.get_branches()
+            self.user_email = self.login
+        author = InputGitAuthor(self.login, self.user_email)
+        repo_path = f"/repos/{self.repo_name}"
+
+        with span("vc.get_branches"):
+            branch = self._get(f"{repo_path}/branches/{target_branch}")
 
-        if target_branch in [b.name for b in branches]:
-            CONSOLE_LOGGER.info(f"Branch {target_branch} already exists")
-            branch = self.repo.get_git_ref(f"heads/{target_branch}")
+        if branch is not None:
+            CONSOLE_LOGGER.info("Branch %s already exists", target_branch)
         else:
-            base_ref = self.repo.get_branch(base_branch)
+            base_ref = self._get(f"{repo_path}/branches/{base_branch}")
+            if base_ref is None:
+                raise Exception(f"Base branch {base_branch} does not exist")
             self.repo.create_git_ref(
-                f"refs/heads/{target_branch}", sha=base_ref.commit.sha
+                f"refs/heads/{target_branch}", sha=base_ref["commit"]["sha"]
             )
             CONSOLE_LOGGER.info(
-                f"New branch {target_branch} created in repository {self.repo.name}"
+                "New branch %s created in repository %s",
+                target_branch,
+                self.repo_name,
             )
 
-        # Read input files from the local directory
-        files = []
-        for file_name in os.listdir(input_dir):
-            file_path = os.path.join(input_dir, file_name)
-            with open(file_path, "r") as f:
-                file_content = f.read()
-            files.append({"name": file_name, "content": file_content})
+        # Read input files from the local directory, archive or standard input
+        files = [
+            {"name": file_name, "content": file_content}
+            for file_name, file_content in read_views(input_dir)
+        ]
+
+        if journal is not None:
+            # Skip the files committed by a previous run and left unchanged since
+            pending_files = [
+                file
+                for file in files
+                if not journal.is_completed(file["name"], git_blob_sha(file["content"]))
+            ]
+            if len(pending_files) < len(files):
+                CONSOLE_LOGGER.info(
+                    "Skipping %s files committed by a previous run",
+                    len(files) - len(pending_files),
+                )
+            files = pending_files
+
+        # List the existing files once per directory. The listing contains the git
+        # blob SHA of each file, so unchanged files are detected without
+        # downloading them.
+        existing_files = {}
+        for directory in sorted({posixpath.dirname(f["name"]) for f in files}):
+            directory_path = output_dir + "/" + directory if directory else output_dir
+            with span("vc.list_contents"):
+                contents = self._get(
+                    f"{repo_path}/contents/{directory_path}", {"ref": target_branch}
+                )
+            for content_file in contents or []:
+                if content_file["type"] == "file":
+                    name = posixpath.join(directory, content_file["name"])
+                    existing_files[name] = content_file["sha"]
 
         has_changes = False
         # Compare base layer files
         for file in files:
             output_path = output_dir + "/" + file["name"]
-            contents = self.repo.get_contents(output_dir, ref=target_branch)
+            table_name = posixpath.basename(file["name"]).split(".")[0]
+            file_sha = git_blob_sha(file["content"])
 
-            if file["name"] in [content_file.name for content_file in contents]:
+            if file["name"] in existing_files:
                 if file_update_message:
                     message = file_update_message
                 else:
                     message = f"update {file['name']}"
-                content_file = self.repo.get_contents(output_path, ref=target_branch)
                 # Compare file contents
-                if content_file.decoded_content.decode() == file["content"]:
+                existing_sha = existing_files[file["name"]]
+                if existing_sha == file_sha:
                     CONSOLE_LOGGER.info(
-                        f"File {file['name']} already exists and it is up to date"
+                        "File %s already exists and it is up to date",
+                        file["name"],
+                        extra={"table": table_name, "phase": "vc.list_contents"},
                     )
+                    if journal is not None:
+                        journal.record(file["name"], file_sha)
                     continue
                 has_changes = True
-                self.repo.update_file(
-                    path=output_path,
-                    message=message,
-                    content=file["content"],
-                    sha=content_file.sha,
-                    branch=target_branch,
-                    author=author,
+                with span("vc.update_file", table=table_name):
+                    self.repo.update_file(
+                        path=output_path,
+                        message=message,
+                        content=file["content"],
+                        sha=existing_sha,
+                        branch=target_branch,
+                        author=author,
+                    )
+                if journal is not None:
+                    journal.record(file["name"], file_sha)
+                CONSOLE_LOGGER.info(
+                    "File %s has been updated",
+                    file["name"],
+                    extra={"table": table_name, "phase": "vc.update_file"},
                 )
-                CONSOLE_LOGGER.info(f"File {file['name']} has been updated")
                 continue
 
             else:
@@ -89,15 +279,30 @@ class GithubClient:
                     message = file_creation_message
                 else:
                     message = f"create {file['name']}"
-                self.repo.create_file(
-                    path=output_path,
-                    message=message,
-                    content=file["content"],
-                    branch=target_branch,
-                    committer=author,
-                    author=author,
+                with span("vc.create_file", table=table_name):
+                    self.repo.create_file(
+                        path=output_path,
+                        message=message,
+                        content=file["content"],
+                        branch=target_branch,
+                        committer=author,
+                        author=author,
+                    )
+                if journal is not None:
+                    journal.record(file["name"], file_sha)
+                CONSOLE_LOGGER.info(
+                    "File %s has been created",
+                    file["name"],
+                    extra={"table": table_name, "phase": "vc.create_file"},
                 )
-                CONSOLE_LOGGER.info(f"File {file['name']} has been created")
+
+        if self.cache:
+            CONSOLE_LOGGER.info(
+                "GitHub cache: %s hits, %s misses (%.0f%% hit rate)",
+                self.cache.hits,
+                self.cache.misses,
+                self.cache.get_hit_rate() * 100,
+            )
 
         # Return if there are no changes
         if not has_changes:
@@ -113,7 +318,7 @@ class GithubClient:
         pulls = self.repo.get_pulls(state="open", sort="created", base=base_branch)
         if target_branch in [pull.head.ref for pull in pulls]:
             CONSOLE_LOGGER.info(
-                f"Pull request already exists for branch {target_branch}"
+                "Pull request already exists for branch %s", target_branch
             )
             return
 
@@ -125,12 +330,156 @@ class GithubClient:
             head=f"{target_branch}",
             draft=True,
         )
-        CONSOLE_LOGGER.info(f"Pull request created: {pull_request.html_url}")
+        CONSOLE_LOGGER.info("Pull request created: %s", pull_request.html_url)
 
     def delete_branch(self, branch_name: str):
         try:
             ref = self.repo.get_git_ref(f"heads/{branch_name}")
             ref.delete()
-            CONSOLE_LOGGER.info(f"Branch {branch_name} deleted")
+            CONSOLE_LOGGER.info("Branch %s deleted", branch_name)
         except UnknownObjectException:
-            CONSOLE_LOGGER.warn(f"{branch_name} does not exist")
+            CONSOLE_LOGGER.warning("%s does not exist", branch_name)
+
+
+class GitClient:
+    def __init__(
+        self,
+        token: str,
+        repo: str,
+        user_email: str = None,
+        user_name: str = "optician",
+        remote_url: str = None,
+    ):
+        """Client that pushes files through a local git working tree.
+
+        Args:
+            token (str): GitHub Token, used to authenticate to https remote URLs.
+            repo (str): GitHub Repo, e.g. mycompany/looker
+            user_email (str): Email of the commit author.
+            user_name (str): Name of the commit author.
+            remote_url (str): URL of the remote repository. Defaults to the GitHub
+                repository. Use a file:// URL to push to a local bare repository.
+        """
+        self.token = token
+        self.repo = repo
+        self.user_name = user_name
+        self.user_email = user_email or f"{user_name}@users.noreply.github.com"
+        if remote_url is None:
+            remote_url = f"https://github.com/{repo}.git"
+        self.remote_url = remote_url
+        self._env = self._get_auth_env()
+
+    def _get_auth_env(self):
+        # Pass the token in an http.extraHeader set through the environment
+        # (git >= 2.31), so it is neither in the command lines of the git processes
+        # nor written to the .git/config of the clone
+        env = dict(os.environ, GIT_TERMINAL_PROMPT="0")
+        if self.token and self.remote_url.startswith("https://"):
+            credentials = base64.b64encode(f"x-access-token:{self.token}".encode())
+            env.update(
+                {
+                    "GIT_CONFIG_COUNT": "1",
+                    "GIT_CONFIG_KEY_0": f"http.{self.remote_url}.extraHeader",
+                    "GIT_CONFIG_VALUE_0": "Authorization: Basic "
+                    + credentials.decode(),
+                }
+            )
+        return env
+
+    def _git(self, *args, cwd: str = None):
+        # Name of the git subcommand, skipping the -c options
+        command = next(a for a in args if not a.startswith("-") and "=" not in a)
+        with span(f"git.{command}"):
+            result = subprocess.run(
+                ["git", *args],
+                cwd=cwd,
+                env=self._env,
+                capture_output=True,
+                text=True,
+                check=False,
+            )
+        if result.returncode != 0:
+            # Don't leak the token in the logs
+            error = result.stderr.strip()
+            if self.token:
+                error = error.replace(self.token, "***")
+            raise Exception(f"git {command} failed: {error}")
+        return result.stdout
+
+    def _remote_branch_exists(self, branch: str):
+        output = self._git("ls-remote", "--heads", self.remote_url, branch)
+        return output.strip() != ""
+
+    def update_files(
+        self,
+        input_dir: str,
+        output_dir: str,
+        target_branch: str,
+        base_branch: str = "main",
+        commit_message: str = None,
+    ):
+        output_dir = output_dir.strip("/")
+        with tempfile.TemporaryDirectory() as work_dir:
+            # Shallow and sparse clone, so only output_dir is downloaded
+            branch_exists = self._remote_branch_exists(target_branch)
+            if branch_exists:
+                CONSOLE_LOGGER.info("Branch %s already exists", target_branch)
+            self._git(
+                "clone",
+                "--depth",
+                "1",
+                "--filter=blob:none",
+                "--sparse",
+                "--branch",
+                target_branch if branch_exists else base_branch,
+                self.remote_url,
+                work_dir,
+            )
+            self._git("sparse-checkout", "set", output_dir, cwd=work_dir)
+            if not branch_exists:
+                self._git("checkout", "-b", target_branch, cwd=work_dir)
+
+            # Write input files to the working tree
+            for file_name, file_content in read_views(input_dir):
+                file_path = os.path.join(work_dir, output_dir, file_name)
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                with open(file_path, "w") as file:
+                    file.write(file_content)
+
+            # Let git detect the unchanged files
+            self._git("add", "--", output_dir, cwd=work_dir)
+            changed = self._git(
+                "diff", "--cached", "--name-status", cwd=work_dir
+            ).splitlines()
+            if not changed:
+                CONSOLE_LOGGER.info(
+                    "No changes detected. No commits have been made to the repository"
+                )
+                return
+
+            for line in changed:
+                status, file_path = line.split(maxsplit=1)
+                action = "created" if status == "A" else "updated"
+                CONSOLE_LOGGER.info("File %s has been %s", file_path, action)
+
+            if not commit_message:
+                commit_message = f"update {len(changed)} LookML views"
+            self._git(
+                "-c",
+                f"user.name={self.user_name}",
+                "-c",
+                f"user.email={self.user_email}",
+                "commit",
+                "--quiet",
+                "-m",
+                commit_message,
+                cwd=work_dir,
+            )
+            self._git(
+                "push", "origin", f"HEAD:refs/heads/{target_branch}", cwd=work_dir
+            )
+            CONSOLE_LOGGER.info(
+                "Pushed %s file(s) to branch %s in one commit",
+                len(changed),
+                target_branch,
+            )
@@ -0,0 +1,129 @@
+import json
+import os
+import time
+
+from optician.logger import get_logger
+from optician.lookml_generator import LookMLGenerator
+
+CONSOLE_LOGGER = get_logger()
+
+DBT_ARTIFACTS = ["run_results.json", "manifest.json"]
+# dbt commands that build models. Others, like compile or test, also write
+# run_results.json with successful model results but don't change the tables.
+DBT_BUILD_COMMANDS = ["run", "build"]
+
+
+class DbtArtifactWatcher:
+    def __init__(
+        self,
+        lookml: LookMLGenerator,
+        target_dir: str = "target",
+        output_dir: str = None,
+        override_dataset_id: str = None,
+        tables: list = None,
+        poll_interval: float = 1.0,
+        debounce: float = 2.0,
+    ):
+        """Regenerate the LookML views of the models rebuilt by dbt.
+
+        The dbt artifacts are polled with a stat call per file, which is cheap and
+        works on every platform and filesystem.
+
+        Args:
+            lookml (LookMLGenerator): Generator of the views, whose database client
+                is reused between the runs.
+            target_dir (str): dbt target directory containing the artifacts.
+            output_dir (str): Output Directory of the views.
+            override_dataset_id (str): Override Dataset ID of the views.
+            tables (list): Only regenerate these tables. All models if None.
+            poll_interval (float): Seconds between two checks of the artifacts.
+            debounce (float): Seconds the artifacts must be unchanged before
+                regenerating, since dbt writes them at the end of a run.
+        """
+        self.lookml = lookml
+        self.target_dir = target_dir
+        self.output_dir = output_dir
+        self.override_dataset_id = override_dataset_id
+        self.tables = set(tables) if tables else None
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+
+    def _get_artifacts_state(self):
+        state = []
+        for artifact in DBT_ARTIFACTS:
+            try:
+                stat = os.stat(os.path.join(self.target_dir, artifact))
+                state.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                state.append(None)
+        return tuple(state)
+
+    def _read_artifact(self, artifact: str):
+        with open(os.path.join(self.target_dir, artifact), "r") as file:
+            return json.load(file)
+
+    def get_rebuilt_models(self):
+        """Return the tables of the models successfully built by the last dbt run."""
+        run_results = self._read_artifact("run_results.json")
+        command = run_results.get("args", {}).get("which")
+        if command not in DBT_BUILD_COMMANDS:
+            CONSOLE_LOGGER.info("Ignoring dbt %s, which doesn't build models", command)
+            return []
+        nodes = self._read_artifact("manifest.json").get("nodes", {})
+
+        models = []
+        for result in run_results.get("results", []):
+            unique_id = result.get("unique_id", "")
+            if not unique_id.startswith("model.") or result.get("status") != "success":
+                continue
+            node = nodes.get(unique_id, {})
+            # Skip the models built in another dataset than the one we read from
+            if node.get("schema", self.lookml.dataset_id) != self.lookml.dataset_id:
+                continue
+            table = node.get("alias") or node.get("name") or unique_id.split(".")[-1]
+            if self.tables is None or table in self.tables:
+                models.append(table)
+        return models
+
+    def regenerate(self):
+        try:
+            models = self.get_rebuilt_models()
+        except (OSError, ValueError) as e:
+            CONSOLE_LOGGER.warning("Could not read the dbt artifacts: %s", e)
+            return []
+
+        if not models:
+            CONSOLE_LOGGER.info("No rebuilt models to regenerate")
+            return []
+
+        CONSOLE_LOGGER.info("Regenerating rebuilt models: %s", models)
+        return self.lookml.generate_batch_lookml_views(
+            tables=models,
+            output_dir=self.output_dir,
+            override_dataset_id=self.override_dataset_id,
+        )
+
+    def watch(self):
+        CONSOLE_LOGGER.info("Watching dbt artifacts in %s", self.target_dir)
+        processed_state = self._get_artifacts_state()
+        last_state = processed_state
+        last_change = None
+        while True:
+            time.sleep(self.poll_interval)
+            state = self._get_artifacts_state()
+            if state != last_state:
+                last_state = state
+                last_change = time.monotonic()
+                continue
+
+            # Wait until the artifacts stop changing before reading them
+            if state == processed_state or last_change is None:
+                continue
+            if time.monotonic() - last_change < self.debounce:
+                continue
+
+            processed_state = state
+            try:
+                self.regenerate()
+            except Exception:
+                CONSOLE_LOGGER.exception("Failed to regenerate the LookML views")
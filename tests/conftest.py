@@ -0,0 +1,156 @@
+import base64
+import hashlib
+import json
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from optician.db_client.db_client import Field, Table
+from optician.vc_client.vc_client import git_blob_sha
+
+REPO = "mycompany/looker"
+
+
+class FakeDbClient:
+    """BigQuery client serving the fields of schemas, failing on the tables in fail.
+
+    Tables not in schemas have a single id column.
+    """
+
+    db_type = "bigquery"
+
+    def __init__(self, schemas: dict = None, fail=()):
+        self.schemas = schemas or {}
+        self.fail = set(fail)
+        self.fetched = []
+
+    def get_table(self, dataset_id, table_id, last_modified=None):
+        if table_id in self.fail:
+            raise Exception(f"Failed to fetch {table_id}")
+        self.fetched.append(table_id)
+        table = Table(table_id, None)
+        fields = self.schemas.get(table_id, [Field("id", "INT64", "NULLABLE", None)])
+        for field in fields:
+            table.add_field_to_schema(field)
+        return table
+
+    def iter_tables(self, dataset_id, table_ids, max_workers=8, executor=None):
+        for table_id in table_ids:
+            yield self.get_table(dataset_id, table_id)
+
+    @staticmethod
+    def is_nested_field(field):
+        return field.internal_type == "RECORD" and field.mode == "NULLABLE"
+
+
+class FakeGithub:
+    """Minimal GitHub REST API serving branches and file contents from memory.
+
+    Listings carry an ETag and answer conditional requests with 304. Writes can be
+    made to fail after fail_after successful ones, to interrupt a push.
+    """
+
+    def __init__(self):
+        self.branches = {"main": "0" * 40}
+        self.files = {}
+        self.requests = []
+        self.writes = []
+        self.fail_after = None
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def statuses(self, method="GET"):
+        return [status for m, _, status in self.requests if m == method]
+
+    def get(self, path: str):
+        repo_path = f"/repos/{REPO}"
+        if path == "/user":
+            return {"login": "bot"}
+        if path.startswith(f"{repo_path}/branches/"):
+            name = path[len(f"{repo_path}/branches/") :]
+            if name in self.branches:
+                return {"name": name, "commit": {"sha": self.branches[name]}}
+            return None
+        if path.startswith(f"{repo_path}/contents/"):
+            directory = path[len(f"{repo_path}/contents/") :]
+            listing = [
+                {"type": "file", "name": name, "sha": git_blob_sha(content)}
+                for file_path, content in sorted(self.files.items())
+                for parent, _, name in [file_path.rpartition("/")]
+                if parent == directory
+            ]
+            return listing or None
+        return None
+
+    def write(self, method: str, path: str, payload: dict):
+        if self.fail_after is not None and len(self.writes) >= self.fail_after:
+            return 422, {"message": "Interrupted"}
+        repo_path = f"/repos/{REPO}"
+        if method == "POST" and path == f"{repo_path}/git/refs":
+            self.branches[payload["ref"][len("refs/heads/") :]] = payload["sha"]
+            self.writes.append(("ref", payload["ref"]))
+            return 201, {"ref": payload["ref"], "object": {"sha": payload["sha"]}}
+        file_path = path[len(f"{repo_path}/contents/") :]
+        if ("sha" in payload) != (file_path in self.files):
+            return 422, {"message": "sha mismatch"}
+        self.files[file_path] = base64.b64decode(payload["content"]).decode()
+        self.writes.append(("update" if "sha" in payload else "create", file_path))
+        return 201, {
+            "content": {"path": file_path, "sha": git_blob_sha(self.files[file_path])},
+            "commit": {"sha": "1" * 40},
+        }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body=None, headers: dict = None):
+                fake.requests.append((self.command, self.path, status))
+                data = json.dumps(body).encode() if body is not None else b""
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+                body = fake.get(path)
+                if body is None:
+                    return self._send(404, {"message": "Not Found"})
+                data = json.dumps(body).encode()
+                etag = '"%s"' % hashlib.sha256(data).hexdigest()
+                if self.headers.get("If-None-Match") == etag:
+                    return self._send(304, headers={"ETag": etag})
+                self._send(200, body, {"ETag": etag})
+
+            def _do_write(self):
+                path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                self._send(*fake.write(self.command, path, payload))
+
+            do_PUT = _do_write
+            do_POST = _do_write
+
+        return Handler
+
+
+@pytest.fixture
+def fake_github():
+    fake = FakeGithub()
+    yield fake
+    fake.close()
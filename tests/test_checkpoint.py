@@ -0,0 +1,122 @@
+import json
+
+import pytest
+from github.GithubException import GithubException
+
+from conftest import REPO, FakeDbClient
+from optician.checkpoint import (
+    CheckpointJournal,
+    get_content_fingerprint,
+    get_file_fingerprint,
+)
+from optician.lookml_generator.lookml_generator import Config, LookMLGenerator
+from optician.vc_client import GithubClient
+
+
+def read_journal(journal_path):
+    with open(journal_path) as file:
+        return [json.loads(line) for line in file]
+
+
+def test_record_is_flushed_before_sync(tmp_path):
+    journal_path = tmp_path / "journal.json"
+    journal = CheckpointJournal(str(journal_path), "run", sync_every=100)
+
+    journal.record("deals", "abc")
+
+    # Readable by another process before the batch is synced
+    assert read_journal(journal_path) == [
+        {"run": "run"},
+        {"key": "deals", "fingerprint": "abc"},
+    ]
+    journal.close()
+
+
+def test_resume_other_run_starts_again(tmp_path):
+    journal_path = str(tmp_path / "journal.json")
+    journal = CheckpointJournal(journal_path, "run")
+    journal.record("deals", "abc")
+    journal.close()
+
+    journal = CheckpointJournal(journal_path, "other run", resume=True)
+
+    assert not journal.is_completed("deals", "abc")
+    assert read_journal(journal_path) == [{"run": "other run"}]
+    journal.finish()
+
+
+def test_content_fingerprint_matches_file(tmp_path):
+    view_path = tmp_path / "deals.view.lkml"
+    view_path.write_text("view: deals {\n}")
+
+    assert get_content_fingerprint("view: deals {\n}") == get_file_fingerprint(
+        str(view_path)
+    )
+
+
+def test_resume_generate_batch_lookml_views(tmp_path, monkeypatch):
+    monkeypatch.delenv("OPTICIAN_CONFIG_FILE", raising=False)
+    monkeypatch.chdir(tmp_path)
+    journal_path = str(tmp_path / "journal.json")
+    tables = ["contacts", "deals", "orders", "users"]
+
+    # The run is interrupted while fetching orders
+    client = FakeDbClient(fail={"orders"})
+    lookml = LookMLGenerator(client, "dbt", config=Config())
+    journal = CheckpointJournal(journal_path, "run")
+    with pytest.raises(Exception, match="orders"):
+        lookml.generate_batch_lookml_views(tables, "views", journal=journal)
+    journal.close()
+    assert client.fetched == ["contacts", "deals"]
+
+    # deals was edited since, its view is generated again
+    (tmp_path / "views" / "deals.view.lkml").write_text("edited")
+
+    client = FakeDbClient()
+    lookml = LookMLGenerator(client, "dbt", config=Config())
+    journal = CheckpointJournal(journal_path, "run", resume=True)
+    paths = lookml.generate_batch_lookml_views(tables, "views", journal=journal)
+    journal.finish()
+
+    assert client.fetched == ["deals", "orders", "users"]
+    assert sorted(paths) == [f"views/{table}.view.lkml" for table in tables]
+    assert (tmp_path / "views" / "deals.view.lkml").read_text() != "edited"
+
+
+def test_resume_github_update_files(tmp_path, fake_github):
+    input_dir = tmp_path / "lookml"
+    input_dir.mkdir()
+    for name in ["contacts", "deals", "orders", "users"]:
+        (input_dir / f"{name}.view.lkml").write_text(f"view: {name} {{\n}}")
+    journal_path = str(tmp_path / "journal.json")
+    client = GithubClient(token="token", repo=REPO, base_url=fake_github.url)
+    # PyGithub waits a second between writes to respect the GitHub rate limits
+    client.repo._requester._Requester__seconds_between_writes = None
+
+    # The push is interrupted after creating the branch, contacts and deals
+    fake_github.fail_after = 3
+    journal = CheckpointJournal(journal_path, "run")
+    with pytest.raises(GithubException):
+        client.update_files(str(input_dir), "_base", "update-views", journal=journal)
+    journal.close()
+    assert fake_github.writes == [
+        ("ref", "refs/heads/update-views"),
+        ("create", "_base/contacts.view.lkml"),
+        ("create", "_base/deals.view.lkml"),
+    ]
+
+    # deals was changed since, it is updated again
+    (input_dir / "deals.view.lkml").write_text("view: deals {\n  changed\n}")
+
+    fake_github.fail_after = None
+    fake_github.writes = []
+    journal = CheckpointJournal(journal_path, "run", resume=True)
+    client.update_files(str(input_dir), "_base", "update-views", journal=journal)
+    journal.finish()
+
+    assert fake_github.writes == [
+        ("update", "_base/deals.view.lkml"),
+        ("create", "_base/orders.view.lkml"),
+        ("create", "_base/users.view.lkml"),
+    ]
+    assert fake_github.files["_base/deals.view.lkml"] == "view: deals {\n  changed\n}"
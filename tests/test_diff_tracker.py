@@ -0,0 +1,47 @@
+import json
+from datetime import datetime, timezone
+
+from optician.diff_tracker import commit_pending_runs, read_last_run, write_last_run
+
+KEY = "project.dbt_dev:dbt_prod"
+FIRST_RUN = datetime(2024, 5, 1, 9, tzinfo=timezone.utc)
+SECOND_RUN = datetime(2024, 5, 2, 9, tzinfo=timezone.utc)
+
+
+def test_write_last_run(tmp_path):
+    state_file = str(tmp_path / "state.json")
+    assert read_last_run(state_file, KEY) is None
+
+    write_last_run(state_file, KEY, FIRST_RUN)
+
+    assert read_last_run(state_file, KEY) == FIRST_RUN
+
+
+def test_pending_run_is_saved_once_committed(tmp_path):
+    state_file = str(tmp_path / "state.json")
+    write_last_run(state_file, KEY, FIRST_RUN)
+
+    write_last_run(state_file, KEY, SECOND_RUN, pending=True)
+    # The pipeline failed after the diff, the next run compares the same models
+    assert read_last_run(state_file, KEY) == FIRST_RUN
+
+    assert commit_pending_runs(state_file) == [KEY]
+    assert read_last_run(state_file, KEY) == SECOND_RUN
+    with open(state_file) as file:
+        assert "pending_runs" not in json.load(file)
+
+
+def test_commit_without_pending_runs(tmp_path):
+    state_file = tmp_path / "state.json"
+
+    assert commit_pending_runs(str(state_file)) == []
+    assert not state_file.exists()
+
+
+def test_saved_run_replaces_pending_run(tmp_path):
+    state_file = str(tmp_path / "state.json")
+    write_last_run(state_file, KEY, FIRST_RUN, pending=True)
+    write_last_run(state_file, KEY, SECOND_RUN)
+
+    assert commit_pending_runs(state_file) == []
+    assert read_last_run(state_file, KEY) == SECOND_RUN
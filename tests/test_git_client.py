@@ -0,0 +1,118 @@
+import subprocess
+
+import pytest
+
+from optician.vc_client import GitClient
+
+
+def git(*args, cwd=None):
+    result = subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.strip()
+
+
+@pytest.fixture
+def remote(tmp_path):
+    # Bare repository with a main branch, standing in for the Looker repository
+    bare = tmp_path / "looker.git"
+    git("init", "--quiet", "--bare", "--initial-branch=main", str(bare))
+    seed = tmp_path / "seed"
+    git("clone", "--quiet", str(bare), str(seed))
+    (seed / "README.md").write_text("Looker project\n")
+    git("add", "README.md", cwd=seed)
+    git("commit", "--quiet", "-m", "init", cwd=seed)
+    git("push", "--quiet", "origin", "HEAD:refs/heads/main", cwd=seed)
+    return bare
+
+
+@pytest.fixture
+def client(remote):
+    return GitClient(token="token", repo="mycompany/looker", remote_url=remote.as_uri())
+
+
+def write_views(input_dir, views):
+    for name, content in views.items():
+        path = input_dir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+
+def list_files(remote, branch):
+    return git("ls-tree", "-r", "--name-only", branch, cwd=remote).splitlines()
+
+
+def test_first_push_creates_branch(tmp_path, remote, client):
+    input_dir = tmp_path / "lookml"
+    write_views(input_dir, {"deals.view.lkml": "deals", "contacts.view.lkml": "c"})
+
+    client.update_files(str(input_dir), "_base", "update-views", "main")
+
+    assert list_files(remote, "update-views") == [
+        "README.md",
+        "_base/contacts.view.lkml",
+        "_base/deals.view.lkml",
+    ]
+    assert git("show", "update-views:_base/deals.view.lkml", cwd=remote) == "deals"
+    assert git("rev-parse", "update-views~1", cwd=remote) == git(
+        "rev-parse", "main", cwd=remote
+    )
+    assert list_files(remote, "main") == ["README.md"]
+
+
+def test_push_without_changes_makes_no_commit(tmp_path, remote, client):
+    input_dir = tmp_path / "lookml"
+    write_views(input_dir, {"deals.view.lkml": "deals"})
+    client.update_files(str(input_dir), "_base", "update-views", "main")
+    head = git("rev-parse", "update-views", cwd=remote)
+
+    client.update_files(str(input_dir), "_base", "update-views", "main")
+
+    assert git("rev-parse", "update-views", cwd=remote) == head
+
+
+def test_push_to_existing_branch(tmp_path, remote, client):
+    input_dir = tmp_path / "lookml"
+    write_views(input_dir, {"deals.view.lkml": "deals"})
+    client.update_files(str(input_dir), "_base", "update-views", "main")
+    head = git("rev-parse", "update-views", cwd=remote)
+
+    write_views(input_dir, {"deals.view.lkml": "deals v2", "orders.view.lkml": "o"})
+    client.update_files(str(input_dir), "_base", "update-views", "main")
+
+    # One more commit on top of the existing branch, not on top of main
+    assert git("rev-parse", "update-views~1", cwd=remote) == head
+    assert git("show", "update-views:_base/deals.view.lkml", cwd=remote) == "deals v2"
+    assert "_base/orders.view.lkml" in list_files(remote, "update-views")
+
+
+def test_push_sub_directories(tmp_path, remote, client):
+    input_dir = tmp_path / "lookml"
+    write_views(
+        input_dir,
+        {
+            "project.client_a/deals.view.lkml": "a",
+            "project.client_b/deals.view.lkml": "b",
+        },
+    )
+
+    client.update_files(str(input_dir), "_base", "update-views", "main")
+
+    assert list_files(remote, "update-views") == [
+        "README.md",
+        "_base/project.client_a/deals.view.lkml",
+        "_base/project.client_b/deals.view.lkml",
+    ]
+    assert (
+        git("show", "update-views:_base/project.client_b/deals.view.lkml", cwd=remote)
+        == "b"
+    )
+
+
+def test_token_not_in_remote_url():
+    client = GitClient(token="secret", repo="mycompany/looker")
+    assert client.remote_url == "https://github.com/mycompany/looker.git"
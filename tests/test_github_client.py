@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+from conftest import REPO
+from optician.vc_client import GithubClient
+from optician.vc_client.vc_client import HttpCache
+
+
+@pytest.fixture
+def client(tmp_path, fake_github):
+    return GithubClient(
+        token="token",
+        repo=REPO,
+        cache_dir=str(tmp_path / "cache"),
+        base_url=fake_github.url,
+    )
+
+
+def test_get_stores_etag(client, fake_github):
+    assert client._get(f"/repos/{REPO}/branches/main")["commit"]["sha"] == "0" * 40
+
+    url = f"{fake_github.url}/repos/{REPO}/branches/main"
+    entry = client.cache.get(url)
+    assert entry["etag"].startswith('"')
+    assert entry["body"]["name"] == "main"
+    assert (client.cache.hits, client.cache.misses) == (0, 1)
+
+
+def test_get_not_modified_returns_cached_body(client, fake_github):
+    first = client._get(f"/repos/{REPO}/branches/main")
+    second = client._get(f"/repos/{REPO}/branches/main")
+
+    assert second == first
+    assert fake_github.statuses() == [200, 304]
+    assert (client.cache.hits, client.cache.misses) == (1, 1)
+    assert client.cache.get_hit_rate() == 0.5
+
+
+def test_get_refetches_changed_resource(client, fake_github):
+    client._get(f"/repos/{REPO}/branches/main")
+    fake_github.branches["main"] = "2" * 40
+
+    assert client._get(f"/repos/{REPO}/branches/main")["commit"]["sha"] == "2" * 40
+    assert fake_github.statuses() == [200, 200]
+    assert client.cache.get_hit_rate() == 0.0
+
+
+def test_get_missing_resource(client, fake_github):
+    assert client._get(f"/repos/{REPO}/branches/missing") is None
+    assert fake_github.statuses() == [404]
+    assert os.listdir(client.cache.cache_dir) == []
+
+
+def test_get_without_cache(fake_github):
+    client = GithubClient(token="token", repo=REPO, base_url=fake_github.url)
+
+    client._get("/user")
+    client._get("/user")
+
+    assert client.cache is None
+    assert fake_github.statuses() == [200, 200]
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = HttpCache(str(tmp_path), max_entries=2)
+    cache.set("https://api.github.com/a", '"a"', None, "a")
+    cache.set("https://api.github.com/b", '"b"', None, "b")
+    os.utime(cache._entry_path("https://api.github.com/a"), (1, 1))
+    os.utime(cache._entry_path("https://api.github.com/b"), (2, 2))
+
+    cache.set("https://api.github.com/c", '"c"', None, "c")
+
+    assert cache.get("https://api.github.com/a") is None
+    assert cache.get("https://api.github.com/b")["body"] == "b"
+    assert cache.get("https://api.github.com/c")["body"] == "c"
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_cache_hit_rate_without_requests(tmp_path):
+    assert HttpCache(str(tmp_path)).get_hit_rate() == 0.0
@@ -0,0 +1,58 @@
+import pytest
+
+from conftest import FakeDbClient
+from optician.db_client.db_client import Field
+from optician.lookml_generator.lookml_generator import Config, LookMLGenerator
+from optician.lookml_generator.rules import CompiledRules
+
+
+def record(name, *fields):
+    field = Field(name, "RECORD", "NULLABLE", None)
+    for nested_field in fields:
+        field.add_nested_field(nested_field)
+    return field
+
+
+@pytest.mark.parametrize("lookml_type", ["string", "number", "yesno", "date_month"])
+def test_valid_type(lookml_type):
+    rules = CompiledRules(rules=[{"columns": ["code"], "type": lookml_type}])
+
+    assert rules.for_table("deals").get_actions("code") == {"type": lookml_type}
+
+
+@pytest.mark.parametrize("lookml_type", ["strnig", "duration", "tier", "STRING"])
+def test_invalid_type(lookml_type):
+    with pytest.raises(Exception, match="Invalid LookML type"):
+        CompiledRules(rules=[{"columns": ["code"], "type": lookml_type}])
+
+
+def test_nested_columns_match_dotted_path(monkeypatch):
+    monkeypatch.delenv("OPTICIAN_CONFIG_FILE", raising=False)
+    config = Config()
+    config.compiled_rules = CompiledRules(
+        rules=[
+            {"columns": ["address.geo.lat"], "label": "Latitude"},
+            {"columns": "^address\\.[a-z]+$", "hidden": True},
+        ]
+    )
+    client = FakeDbClient(
+        schemas={
+            "contacts": [
+                record(
+                    "address",
+                    Field("city", "STRING", "NULLABLE", None),
+                    record("geo", Field("lat", "FLOAT64", "NULLABLE", None)),
+                )
+            ]
+        }
+    )
+    lookml = LookMLGenerator(client, "dbt", config=config)
+
+    fields = lookml.render_fields(client.get_table("dbt", "contacts"))
+
+    assert (
+        "  dimension: address__city {\n"
+        "    hidden: yes\n"
+        '    group_label: "Address"\n'
+    ) in fields
+    assert '  dimension: address__geo__lat {\n    label: "Latitude"\n' in fields
@@ -0,0 +1,84 @@
+import io
+import sys
+
+import pytest
+
+from optician.cli.commands import cli
+from optician.sinks import StdoutSink, open_sink, read_views
+
+VIEWS = {
+    "deals.view.lkml": "view: deals {\n}",
+    "project.dataset/contacts.view.lkml": "view: contacts {\n}",
+}
+
+
+def write_views(sink, fail=False):
+    with sink:
+        for name, content in VIEWS.items():
+            sink.write(name, content)
+        if fail:
+            raise Exception("Failed to generate orders")
+
+
+class Stream:
+    def __init__(self, data=b""):
+        self.buffer = io.BytesIO(data)
+
+
+@pytest.mark.parametrize("name", ["views", "views.tar", "views.tar.gz", "views.zip"])
+def test_read_written_views(tmp_path, name):
+    path = str(tmp_path / name)
+    write_views(open_sink(path))
+
+    assert dict(read_views(path)) == VIEWS
+
+
+@pytest.mark.parametrize("name", ["views.tar", "views.tgz", "views.zip"])
+def test_failed_run_removes_archive(tmp_path, name):
+    with pytest.raises(Exception, match="orders"):
+        write_views(open_sink(str(tmp_path / name)), fail=True)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_stream_views(monkeypatch):
+    monkeypatch.setattr(sys, "stdout", Stream())
+    write_views(StdoutSink())
+
+    monkeypatch.setattr(sys, "stdin", Stream(sys.stdout.buffer.getvalue()))
+    assert dict(read_views("-")) == VIEWS
+
+
+def test_failed_stream_is_truncated(monkeypatch):
+    monkeypatch.setattr(sys, "stdout", Stream())
+    with pytest.raises(Exception, match="orders"):
+        write_views(StdoutSink(), fail=True)
+
+    monkeypatch.setattr(sys, "stdin", Stream(sys.stdout.buffer.getvalue()))
+    with pytest.raises(Exception):
+        list(read_views("-"))
+
+
+def test_truncated_archive_is_rejected(tmp_path):
+    path = tmp_path / "views.tar"
+    write_views(open_sink(str(path)))
+    # Cut the end-of-archive blocks, on a member boundary
+    data = path.read_bytes()
+    path.write_bytes(data[: data.rindex(b"view: contacts") + 512])
+
+    with pytest.raises(Exception, match="truncated"):
+        list(read_views(str(path)))
+
+
+def test_invalid_arguments_create_no_archive(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["optician", "generate_lookml", "--tables", "deals", "--output-dir", "a.tar"],
+    )
+
+    with pytest.raises(SystemExit):
+        cli()
+
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from optician.watcher import DbtArtifactWatcher
+
+
+class FakeLookMLGenerator:
+    dataset_id = "dbt_dev"
+
+
+def write_artifacts(target_dir, command, results):
+    run_results = {
+        "args": {"which": command},
+        "results": [
+            {"unique_id": unique_id, "status": status} for unique_id, status in results
+        ],
+    }
+    manifest = {
+        "nodes": {
+            "model.shop.deals": {"name": "deals", "schema": "dbt_dev"},
+            "model.shop.orders": {"name": "orders", "schema": "dbt_dev"},
+            "model.shop.users": {"name": "users", "schema": "dbt_prod"},
+        }
+    }
+    (target_dir / "run_results.json").write_text(json.dumps(run_results))
+    (target_dir / "manifest.json").write_text(json.dumps(manifest))
+
+
+@pytest.fixture
+def watcher(tmp_path):
+    return DbtArtifactWatcher(FakeLookMLGenerator(), target_dir=str(tmp_path))
+
+
+@pytest.mark.parametrize("command", ["run", "build"])
+def test_rebuilt_models(tmp_path, watcher, command):
+    write_artifacts(
+        tmp_path,
+        command,
+        [
+            ("model.shop.deals", "success"),
+            ("model.shop.orders", "error"),
+            ("model.shop.users", "success"),
+            ("test.shop.not_null_deals_id", "pass"),
+        ],
+    )
+
+    assert watcher.get_rebuilt_models() == ["deals"]
+
+
+@pytest.mark.parametrize("command", ["compile", "test", "seed", "generate"])
+def test_other_commands_are_ignored(tmp_path, watcher, command):
+    write_artifacts(tmp_path, command, [("model.shop.deals", "success")])
+
+    assert watcher.get_rebuilt_models() == []